@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -132,6 +133,82 @@ LOGIN_URL = "auth:login"
 # https://docs.djangoproject.com/en/4.0/ref/settings/#login-redirect-url
 LOGIN_REDIRECT_URL = "index"
 
+# Solver
+# Options passed on to solver.solver.get_schedule. `time_limit` (seconds) and
+# `mip_rel_gap` limit the time spent in HiGHS, see
+# https://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.milp.html
+# `backend` forces one of solver.solver.backends instead of the cheapest one.
+# With `horizon`, schedules longer than that many weeks are solved in chunks,
+# and schedules of up to SOLVER_MAX_DAYS instead of one year can be created.
+# With more than one of `workers`, that many processes solve differently
+# configured copies of the problem, optionally with the `portfolio` backends.
+# The processes are only kept between solves where the solver is preloaded,
+# see SOLVER_PRELOAD, otherwise every solve starts them, which takes seconds.
+SOLVER_OPTIONS = {
+    "time_limit": 30,
+    "mip_rel_gap": None,
+    "presolve": True,
+    "backend": None,
+    "horizon": None,
+    "workers": None,
+    "portfolio": None,
+}
+
+# Longest schedule in days which can be created with a `horizon`
+SOLVER_MAX_DAYS = 10 * 365
+
+# Set SOLVER_ASYNC when `manage.py run_solver_worker` runs. PATCH on a
+# schedule larger than SOLVER_LIMITS["inline"] then queues a solve job and
+# returns 202 instead of solving within the request.
+SOLVER_ASYNC = False
+
+# Solve jobs which are still running this many seconds after they started
+# are failed, e.g. when their worker was killed, and no longer shared by
+# new requests.
+SOLVER_JOB_TIMEOUT = 600
+
+# Import the solver and scipy at startup instead of on the first solve. Set
+# SOLVER_WORKER=1 in the environment of processes which mostly solve, e.g.
+# dedicated web workers for solve requests. `manage.py run_solver_worker`
+# always preloads.
+SOLVER_PRELOAD = bool(os.environ.get("SOLVER_WORKER"))
+
+# Concurrent solves of a schedule are serialized with file locks in this
+# directory, by default in the temporary directory. Processes which share
+# the database should share it too.
+SOLVER_LOCK_DIR = None
+
+# Host-wide limit on concurrent solves. Every solve takes `threads` of the
+# `slots` (by default the number of CPUs), times the number of portfolio
+# workers. At most `queue` requests wait for a slot, for up to `timeout`
+# seconds, others are answered with 503.
+SOLVER_ADMISSION = {
+    "slots": None,
+    "threads": 1,
+    "queue": 16,
+    "timeout": 30,
+}
+
+# Limits on the estimated number of nonzeros of the solver model. Larger
+# schedules than `inline` are solved by a solve job with SOLVER_ASYNC, and
+# otherwise within the request with the heuristic backend instead of the
+# MILP. Solve jobs and `manage.py solve_schedules` use the MILP up to
+# `background`. Larger schedules than `heuristic` are rejected. None
+# disables a limit.
+SOLVER_LIMITS = {
+    "inline": 1_000_000,
+    "background": 10_000_000,
+    "heuristic": 100_000_000,
+}
+
+# Solutions are cached by their input in an in-process LRU of `maxsize`
+# entries. `alias` optionally names an entry in CACHES used as a second tier
+# which is shared between processes.
+SOLVER_CACHE = {
+    "maxsize": 128,
+    "alias": None,
+}
+
 # Logging
 # https://docs.djangoproject.com/en/4.1/topics/logging/#configuring-logging
 LOGGING = {
@@ -151,5 +228,9 @@ LOGGING = {
             "handlers": ["console"],
             "level": "DEBUG",
         },
+        "solver.domain": {
+            "handlers": ["console"],
+            "level": "INFO",
+        },
     },
 }
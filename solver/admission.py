@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from solver.locks import lock, unlock
+
+
+class Busy(Exception):
+    pass
+
+
+class Admission:
+    # Host-wide counting semaphore for solves. Every solve holds `cost` of
+    # the `slots` lock files in `directory`, and requests which have to wait
+    # hold one of the `queue` wait files meanwhile, so that the number of
+    # waiting requests is bounded as well. The locks are file locks, see
+    # solver.locks, which are released when a process dies. Metrics are
+    # counted per process.
+
+    def __init__(self, directory, slots, queue, timeout, poll=0.05):
+        self.directory = directory
+        self.slots = slots
+        self.queue = queue
+        self.timeout = timeout
+        self.poll = poll
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Sent to pool workers, which count their own metrics
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self, cost=1):
+        # Yields the seconds spent waiting, raises Busy if the wait queue is
+        # full or no slots became free within the timeout
+        cost = min(max(cost, 1), self.slots)
+        start = time.perf_counter()
+        wait = 0.0
+        held = self._acquire("slot", cost, self.slots)
+        if held is None:
+            waiting = self._acquire("wait", 1, self.queue)
+            if waiting is None:
+                self._count("rejected")
+                raise Busy("Too many solves are waiting, try again later.")
+            try:
+                while (held := self._acquire("slot", cost, self.slots)) is None:
+                    if time.perf_counter() - start > self.timeout:
+                        self._count("timeouts")
+                        raise Busy("Timed out waiting for a free solver slot.")
+                    time.sleep(self.poll)
+            finally:
+                self._release(waiting)
+            wait = time.perf_counter() - start
+        with self._lock:
+            self.admitted += 1
+            self.wait_time += wait
+            self.max_wait_time = max(self.max_wait_time, wait)
+        try:
+            yield wait
+        finally:
+            self._release(held)
+
+    def metrics(self):
+        return dict(
+            running=self._held("slot", self.slots),
+            queue_depth=self._held("wait", self.queue),
+            admitted=self.admitted,
+            rejected=self.rejected,
+            timeouts=self.timeouts,
+            mean_wait_time=self.wait_time / self.admitted if self.admitted else 0.0,
+            max_wait_time=self.max_wait_time,
+        )
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _acquire(self, prefix, count, total):
+        # All or nothing: `count` of the `total` lock files or None
+        os.makedirs(self.directory, exist_ok=True)
+        held = []
+        for i in range(total):
+            f = open(os.path.join(self.directory, f"{prefix}-{i}.lock"), "a")
+            try:
+                lock(f, blocking=False)
+            except BlockingIOError:
+                f.close()
+                continue
+            held.append(f)
+            if len(held) == count:
+                return held
+        self._release(held)
+        return None
+
+    def _release(self, held):
+        for f in held:
+            unlock(f)
+            f.close()
+
+    def _held(self, prefix, total):
+        # Number of lock files currently held by anyone
+        os.makedirs(self.directory, exist_ok=True)
+        count = 0
+        for i in range(total):
+            with open(os.path.join(self.directory, f"{prefix}-{i}.lock"), "a") as f:
+                try:
+                    lock(f, blocking=False)
+                    unlock(f)
+                except BlockingIOError:
+                    count += 1
+        return count
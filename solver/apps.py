@@ -1,6 +1,27 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class SolverConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "solver"
+
+    def ready(self):
+        from django.core.cache import caches
+
+        from solver.cache import solutions
+
+        options = getattr(settings, "SOLVER_CACHE", {})
+        solutions.maxsize = options.get("maxsize", solutions.maxsize)
+        if alias := options.get("alias"):
+            solutions.store = caches[alias]
+
+        # Other processes only import the solver and scipy on the first solve
+        if getattr(settings, "SOLVER_PRELOAD", False):
+            preload()
+
+
+def preload():
+    import solver.solver
+
+    solver.solver.keep_pools = True
@@ -0,0 +1,19 @@
+import time
+
+from solver.admission import Busy
+from solver.domain import ScheduleException
+
+
+def solve_schedule(args):
+    # Solve a domain schedule in a worker process, admitted like the solves
+    # of requests. Returns the schedule with its new assignments, the
+    # SolveReport or the error, and the latency.
+    schedule, options, admission, cost = args
+    start = time.perf_counter()
+    report, error = None, None
+    try:
+        with admission.admit(cost):
+            report = schedule.make_assignments(**options)
+    except (Busy, ScheduleException) as e:
+        error = str(e)
+    return schedule, report, error, time.perf_counter() - start
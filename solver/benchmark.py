@@ -0,0 +1,174 @@
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import scipy
+
+from solver.solver import get_schedule, make_problem, milp_model
+
+START = datetime.date(2022, 1, 3)
+
+GRID = dict(
+    participants=[10, 50, 200],
+    days=[30, 90, 365],
+    density=[0.2, 0.5],
+    exclude_weekends=[False, True],
+    window=[1, 3],
+)
+
+
+# Statements timed by `startup`: a web process which loads all views, and a
+# solver worker which also preloads the solver
+STARTUP = {
+    "web": "import django; django.setup(); "
+    "from django.urls import get_resolver; get_resolver().url_patterns",
+    "worker": "import django; django.setup(); "
+    "from django.urls import get_resolver; get_resolver().url_patterns; "
+    "from solver.apps import preload; preload()",
+}
+
+
+def generate(participants, days, density, exclude_weekends=False, window=None, seed=0):
+    # A synthetic problem: `days` consecutive calendar days, optionally without
+    # weekends, and participants which are available on each day with
+    # probability `density`.
+    rng = random.Random(seed)
+    dates = [START + datetime.timedelta(days=i) for i in range(days)]
+    if exclude_weekends:
+        dates = [d for d in dates if d.weekday() < 5]
+    preferences = {
+        f"p{i}": {d for d in dates if rng.random() < density}
+        for i in range(participants)
+    }
+    return set(dates), preferences, window
+
+
+def case_name(participants, days, density, exclude_weekends, window):
+    weekends = "noweekends" if exclude_weekends else "weekends"
+    return f"p{participants}-d{days}-a{density}-{weekends}-w{window}"
+
+
+def measure(days, preferences, window=None, **options):
+    # Model build time and nnz refer to the full MILP, before any presolve.
+    # Peak memory covers the allocations traced by Python during the solve,
+    # which includes NumPy arrays but not the memory used inside HiGHS.
+    start = time.perf_counter()
+    problem = make_problem(days, preferences, window)
+    c, _, constraints = milp_model(
+        problem.col_res,
+        problem.col_day,
+        problem.ordinals,
+        problem.window,
+        problem.lower,
+        problem.upper,
+    )
+    build_time = time.perf_counter() - start
+    nnz = sum(constraint.A.nnz for constraint in constraints)
+    del c, constraints
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        get_schedule(days, preferences, window, cache=False, **options)
+        status = "solved"
+    except Exception as e:
+        status = str(e)
+    total_time = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return dict(
+        variables=len(problem.col_res),
+        nnz=nnz,
+        build_time=build_time,
+        solve_time=total_time,
+        peak_memory=peak,
+        status=status,
+    )
+
+
+def run(grid=None, repeat=1, seed=0, **options):
+    grid = dict(GRID, **(grid or {}))
+    results = {}
+    keys = list(GRID)
+    for values in itertools.product(*(grid[key] for key in keys)):
+        params = dict(zip(keys, values))
+        days, preferences, window = generate(seed=seed, **params)
+        runs = [measure(days, preferences, window, **options) for _ in range(repeat)]
+        record = min(runs, key=lambda r: r["solve_time"])
+        results[case_name(**params)] = dict(params, **record)
+    return dict(
+        python=platform.python_version(),
+        scipy=scipy.__version__,
+        cases=results,
+    )
+
+
+def save(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def regressions(
+    baseline,
+    results,
+    threshold=0.2,
+    metrics=("build_time", "solve_time"),
+    min_delta=0.01,
+):
+    # Cases which got worse than the baseline by more than `threshold` (and by
+    # more than `min_delta` to ignore noise on tiny cases), as a list of
+    # (case, metric, baseline value, current value).
+    found = []
+    for name, record in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            continue
+        for metric in metrics:
+            delta = record[metric] - base[metric]
+            if delta > base[metric] * threshold and delta > min_delta:
+                found.append((name, metric, base[metric], record[metric]))
+    return found
+
+
+def startup(repeat=3):
+    # Seconds to run each of the STARTUP statements in a fresh interpreter,
+    # the fastest of `repeat` runs, and whether scipy was imported. The
+    # interpreter startup itself is not included.
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "{}\n"
+        "print(time.perf_counter() - start, 'scipy' in sys.modules)"
+    )
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "scheduler.settings")
+    env.pop("SOLVER_WORKER", None)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    for name, statement in STARTUP.items():
+        times = []
+        for _ in range(repeat):
+            out = subprocess.run(
+                [sys.executable, "-c", code.format(statement)],
+                cwd=root,
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.split()
+            times.append(float(out[0]))
+        results[name] = dict(time=min(times), scipy=out[1] == "True")
+    return results
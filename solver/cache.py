@@ -0,0 +1,80 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def schedule_key(days, preferences, window=None, **params):
+    # Canonical hash of a solver input. Preferred dates outside of `days` do
+    # not change the solution and are left out. Further `params` which change
+    # the solution are included unless they are None.
+    days = sorted(days)
+    included = set(days)
+    data = {
+        "days": [d.isoformat() for d in days],
+        "preferences": sorted(
+            [str(name), sorted(d.isoformat() for d in dates if d in included)]
+            for name, dates in preferences.items()
+        ),
+        "window": window or 1,
+    }
+    data.update((key, val) for key, val in params.items() if val is not None)
+    encoded = json.dumps(data, separators=(",", ":"), sort_keys=True).encode()
+    return "solver:" + hashlib.sha256(encoded).hexdigest()
+
+
+class SolutionCache:
+    # In-process LRU of solver results with an optional second tier, e.g. a
+    # Django cache shared between worker processes. The second tier is any
+    # object with `get(key)` and `set(key, value)` and does its own eviction.
+
+    def __init__(self, maxsize=128, store=None):
+        self.maxsize = maxsize
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(self._entries[key])
+        value = self.store.get(key) if self.store is not None else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._put(key, value)
+        return list(value)
+
+    def set(self, key, value):
+        value = list(value)
+        with self._lock:
+            self._put(key, value)
+        if self.store is not None:
+            self.store.set(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, size=len(self._entries))
+
+    def _put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+solutions = SolutionCache()
@@ -1,8 +1,44 @@
 import datetime
+import logging
 from collections import namedtuple
 from dataclasses import dataclass, field
 
-from solver.solver import get_schedule
+from solver.cache import schedule_key
+from solver.sizing import estimate_size
+
+logger = logging.getLogger(__name__)
+
+
+# solver.solver imports scipy, which is slow to import, so it is only
+# imported on the first solve
+def get_schedule(*args, **kwargs):
+    from solver import solver
+
+    return solver.get_schedule(*args, **kwargs)
+
+
+def repair_schedule(*args, **kwargs):
+    from solver import solver
+
+    return solver.repair_schedule(*args, **kwargs)
+
+
+def resolve_range(*args, **kwargs):
+    from solver import solver
+
+    return solver.resolve_range(*args, **kwargs)
+
+
+def check_feasible(*args, **kwargs):
+    from solver import solver
+
+    return solver.check_feasible(*args, **kwargs)
+
+
+def default_backend(*args, **kwargs):
+    from solver import solver
+
+    return solver.default_backend(*args, **kwargs)
 
 
 def date_range(start, end):
@@ -21,7 +57,11 @@ class AssignmentError(Exception):
 
 
 class ScheduleException(Exception):
-    pass
+    def __init__(self, *args, days=(), participants=()):
+        super().__init__(*args)
+        # For infeasible schedules, days and participants which cause it
+        self.days = list(days)
+        self.participants = list(participants)
 
 
 User = namedtuple("User", "id username")
@@ -80,6 +120,20 @@ class Schedule:
             for date in participant.assignments.copy()
         )
 
+    def key(self):
+        # Hash of the solver input, see solver.cache.schedule_key
+        return schedule_key(self.days, self.preferences, self.window)
+
+    def estimate_size(self, start=None, end=None):
+        # Upper bounds on the size of the solver model, see estimate_size, of
+        # the days from start to end if given
+        days = [
+            d
+            for d in self.days
+            if (start is None or d >= start) and (end is None or d <= end)
+        ]
+        return estimate_size(days, self.preferences, self.window)
+
     def add_day(self, date):
         self.days.add(date)
 
@@ -119,15 +173,77 @@ class Schedule:
         for participant in self._participants.values():
             participant.assignments.clear()
 
-    def make_assignments(self):
+    def make_assignments(self, **options):
+        return self._solve(get_schedule, **options)
+
+    def repair_assignments(self, **options):
+        # Keep the current assignments where possible and only solve the days
+        # around broken ones again, see repair_schedule
+        assignments = [(d, p) for p, d in self.assignments]
+        return self._solve(repair_schedule, assignments, **options)
+
+    def resolve_assignments(self, start, end, **options):
+        # Solve the days from start to end again and keep all other
+        # assignments. If that fails, the current assignments are kept.
+        assignments = [(d, p) for p, d in self.assignments]
+        return self._solve(
+            resolve_range, assignments, start, end, clear_on_error=False, **options
+        )
+
+    def _solve(self, solve, *args, clear_on_error=True, **options):
         try:
-            res = get_schedule(self.days, self.preferences, window=self.window)
+            res, report = solve(
+                self.days,
+                self.preferences,
+                *args,
+                window=self.window,
+                report=True,
+                **options,
+            )
         except Exception as e:
-            raise ScheduleException(e)
-        finally:
-            self.clear_assignments()
+            if clear_on_error:
+                self.clear_assignments()
+            raise ScheduleException(
+                e,
+                days=getattr(e, "days", ()),
+                participants=getattr(e, "resources", ()),
+            )
+        self.clear_assignments()
+        logger.info(f"Solved schedule {self.id}: {report}")
         for d, p in res:
             self.add_assignment(p, d)
+        return report
+
+    def backend(self, backend=None):
+        # Name of the solver backend make_assignments would use
+        return default_backend(self.days, self.preferences, self.window, backend)
+
+    def copy(self):
+        # Independent copy, e.g. to try out changes without saving them
+        other = Schedule(id=self.id, owner=self.owner, window=self.window)
+        other.days = set(self.days)
+        other._participants = {
+            name: Participant(set(p.preferences), set(p.assignments))
+            for name, p in self._participants.items()
+        }
+        return other
+
+    def check(self):
+        # Whether the schedule can be solved, from the conditions which are
+        # checked without solving it, see check_feasible. Returns whether the
+        # check is exact.
+        try:
+            return check_feasible(self.days, self.preferences, self.window)
+        except Exception as e:
+            raise ScheduleException(
+                e,
+                days=getattr(e, "days", ()),
+                participants=getattr(e, "resources", ()),
+            )
 
     def has_assignments(self):
         return True if self.assignments else False
+
+    def is_solved(self):
+        # Whether every day has an assignment
+        return {d for _, d in self.assignments} >= self.days
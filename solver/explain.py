@@ -0,0 +1,164 @@
+from collections import namedtuple
+
+import numpy as np
+
+from solver.flow import matching
+
+# A set of days and resources which cannot be solved on their own, `needed`
+# assignments against `available` ones. Kinds:
+# - "unavailable": nobody prefers the days
+# - "short": the resources prefer less days than their lower bounds, or less
+#   days which are at least `window` days apart
+# - "days": the days need one assignment each, the resources are the only
+#   ones available on them and can take at most `available`
+# - "resources": the resources need their lower bounds but only prefer
+#   `available` days together
+# - "window": the days lie within one window, so every resource takes at
+#   most one of them
+Certificate = namedtuple("Certificate", "kind days resources needed available")
+
+
+def explain(col_res, col_day, ordinals, window, lower, upper):
+    # A small certificate of infeasibility, or None if none is found. Each
+    # certificate is a Hall violator of a maximum matching between resources
+    # and days, which is read off the matching by following alternating
+    # paths from an unmatched day or resource.
+    col_res = np.asarray(col_res, dtype=np.int64)
+    col_day = np.asarray(col_day, dtype=np.int64)
+    n_days = len(ordinals)
+    capacity = np.minimum(
+        upper, window_capacity(col_res, col_day, ordinals, window, len(lower))
+    )
+    return (
+        short_resources(capacity, lower)
+        or uncovered_days(col_res, col_day, capacity, n_days)
+        or short_window(col_res, col_day, ordinals, window)
+        or unmatched_resources(col_res, col_day, lower, n_days)
+    )
+
+
+def window_capacity(col_res, col_day, ordinals, window, n_resources):
+    # Most assignments each resource can take with at least `window` days
+    # between them, by taking the earliest preferred day after the last one.
+    # Columns are sorted by resource and day. The jumps from each column to
+    # the next one taken are counted by doubling the jumps.
+    counts = np.bincount(col_res, minlength=n_resources)
+    if window == 1 or not len(col_res):
+        return counts
+    end = len(col_res)
+    stride = ordinals.max() - ordinals.min() + 2 * window
+    keys = col_res * stride + ordinals[col_day] - ordinals.min()
+    jump = np.searchsorted(keys, keys + window)
+    other = jump < end
+    other[other] = col_res[jump[other]] != col_res[other]
+    jump[other] = end
+    jump = np.append(jump, end)
+    first = np.flatnonzero(np.diff(col_res, prepend=-1) != 0)
+    position = first
+    taken = np.ones(len(first), dtype=np.int64)
+    jumps = [jump]
+    while (jumps[-1][:end] < end).any():
+        jumps.append(jumps[-1][jumps[-1]])
+    for k, table in reversed(list(enumerate(jumps))):
+        step = table[position]
+        moved = step < end
+        position = np.where(moved, step, position)
+        taken += moved * 2**k
+    capacity = np.zeros(n_resources, dtype=np.int64)
+    capacity[col_res[first]] = taken
+    return capacity
+
+
+def short_resources(capacity, lower):
+    short = np.flatnonzero(capacity < lower)
+    if len(short):
+        return Certificate(
+            "short",
+            np.zeros(0, dtype=np.int64),
+            short,
+            int(lower[short].sum()),
+            int(capacity[short].sum()),
+        )
+    return None
+
+
+def uncovered_days(col_res, col_day, capacity, n_days):
+    # Days which cannot all be covered by the resources available on them
+    unavailable = np.bincount(col_day, minlength=n_days) == 0
+    if unavailable.any():
+        return Certificate(
+            "unavailable",
+            np.flatnonzero(unavailable),
+            np.zeros(0, dtype=np.int64),
+            int(unavailable.sum()),
+            0,
+        )
+    selected = matching(col_res, col_day, capacity, n_days)
+    owner = np.full(n_days, -1, dtype=np.int64)
+    owner[col_day[selected]] = col_res[selected]
+    if (owner >= 0).all():
+        return None
+    days = np.zeros(n_days, dtype=bool)
+    days[np.argmax(owner < 0)] = True
+    while True:
+        resources = np.unique(col_res[days[col_day]])
+        grown = days | np.isin(owner, resources)
+        if (grown == days).all():
+            break
+        days = grown
+    return Certificate(
+        "days",
+        np.flatnonzero(days),
+        resources,
+        int(days.sum()),
+        int(capacity[resources].sum()),
+    )
+
+
+def unmatched_resources(col_res, col_day, lower, n_days):
+    # Resources which cannot reach their lower bounds on the days they
+    # prefer together
+    selected = matching(col_res, col_day, lower, n_days)
+    count = np.bincount(col_res[selected], minlength=len(lower))
+    if (count >= lower).all():
+        return None
+    owner = np.full(n_days, -1, dtype=np.int64)
+    owner[col_day[selected]] = col_res[selected]
+    resources = np.zeros(len(lower), dtype=bool)
+    resources[np.argmax(count < lower)] = True
+    while True:
+        days = np.unique(col_day[resources[col_res]])
+        grown = resources.copy()
+        grown[owner[days][owner[days] >= 0]] = True
+        if (grown == resources).all():
+            break
+        resources = grown
+    return Certificate(
+        "resources",
+        days,
+        np.flatnonzero(resources),
+        int(lower[resources].sum()),
+        len(days),
+    )
+
+
+def short_window(col_res, col_day, ordinals, window):
+    # Days within `window` days of each other need distinct resources, so
+    # there must be at least as many resources available on them as days
+    if window == 1 or not len(col_res):
+        return None
+    n_resources, n_days = col_res.max() + 1, len(ordinals)
+    preferred = np.zeros((n_resources, n_days + 1), dtype=np.int32)
+    preferred[col_res, col_day + 1] = 1
+    preferred = np.cumsum(preferred, axis=1, dtype=np.int32)
+    first = np.arange(n_days)
+    end = np.searchsorted(ordinals, ordinals + window)
+    available = (preferred[:, end] > preferred[:, first]).sum(axis=0)
+    short = np.flatnonzero(available < end - first)
+    if not len(short):
+        return None
+    first, end = short[0], end[short[0]]
+    resources = np.flatnonzero(preferred[:, end] > preferred[:, first])
+    return Certificate(
+        "window", np.arange(first, end), resources, int(end - first), len(resources)
+    )
@@ -0,0 +1,80 @@
+import os
+import time
+
+from solver.admission import Busy
+from solver.locks import lock, unlock
+
+
+class SingleFlight:
+    # Exclusive lock per name across the processes of one host, held with
+    # solver.locks on a file in `directory`. The file holds a generation, counting
+    # the calls which completed under the lock, and the key of the last one.
+    # `seen` is the generation read before waiting for the lock, so that a
+    # caller can tell whether another call completed while it waited and
+    # whether that result is the one it wanted. With a `timeout`, Busy is
+    # raised when the lock is not free within that many seconds.
+
+    def __init__(self, name, directory, timeout=None, poll=0.05):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{name}.lock")
+        self.timeout = timeout
+        self.poll = poll
+        self.seen = 0
+        self.generation = 0
+        self.last = None
+        self._file = None
+
+    def __enter__(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self.path, "a+")
+        self.seen, _ = self._read()
+        try:
+            self._lock()
+        except Busy:
+            self._file.close()
+            self._file = None
+            raise
+        self.generation, self.last = self._read()
+        return self
+
+    def __exit__(self, *exc_info):
+        unlock(self._file)
+        self._file.close()
+        self._file = None
+
+    def _lock(self):
+        if self.timeout is None:
+            lock(self._file)
+            return
+        start = time.perf_counter()
+        while True:
+            try:
+                lock(self._file, blocking=False)
+                return
+            except BlockingIOError:
+                if time.perf_counter() - start > self.timeout:
+                    raise Busy("Timed out waiting for another solve of the schedule.")
+                time.sleep(self.poll)
+
+    @property
+    def waited(self):
+        # Whether another call completed while waiting for the lock
+        return self.generation > self.seen
+
+    def done(self, key):
+        # Record the key of the completed call
+        self.generation += 1
+        self.last = key
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(f"{self.generation} {key}")
+        self._file.flush()
+
+    def _read(self):
+        # Without the lock the file may be in the middle of a write, which
+        # reads as generation 0
+        self._file.seek(0)
+        generation, _, key = self._file.read().partition(" ")
+        if not generation.isdigit():
+            return 0, None
+        return int(generation), key or None
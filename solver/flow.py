@@ -0,0 +1,130 @@
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+
+class Network:
+    # Bipartite network between resources and days with lower and upper bounds
+    # on the number of assignments per resource and exactly one assignment per
+    # day. Lower bounds are removed with the usual circulation reduction: the
+    # network gets a super source and a super sink, and a feasible assignment
+    # exists iff the maximum flow between them saturates all their edges.
+    #
+    # Nodes: source, sink, super source, super sink, resources, days
+
+    def __init__(self, col_res, col_day, lower, upper, n_days):
+        self.col_res = np.asarray(col_res, dtype=np.int64)
+        self.col_day = np.asarray(col_day, dtype=np.int64)
+        self.lower = np.asarray(lower, dtype=np.int64)
+        self.upper = np.asarray(upper, dtype=np.int64)
+        self.n_resources = len(self.lower)
+        self.n_days = n_days
+
+    def resource_node(self, r):
+        return 4 + r
+
+    def day_node(self, d):
+        return 4 + self.n_resources + d
+
+    @property
+    def required(self):
+        return int(self.lower.sum()) + self.n_days
+
+    def graph(self):
+        source, sink, super_source, super_sink = 0, 1, 2, 3
+        resources = np.arange(self.n_resources)
+        days = np.arange(self.n_days)
+        # Edges from the source to the resources carry the slack between the
+        # bounds, the lower bounds are supplied by the super source instead.
+        tails = [
+            np.full(self.n_resources, source),
+            np.full(self.n_resources, super_source),
+            self.resource_node(self.col_res),
+            self.day_node(days),
+            [super_source, sink, source],
+        ]
+        heads = [
+            self.resource_node(resources),
+            self.resource_node(resources),
+            self.day_node(self.col_day),
+            np.full(self.n_days, super_sink),
+            [sink, source, super_sink],
+        ]
+        capacities = [
+            self.upper - self.lower,
+            self.lower,
+            np.ones(len(self.col_res), dtype=np.int64),
+            np.ones(self.n_days, dtype=np.int64),
+            [self.n_days, self.n_days, self.lower.sum()],
+        ]
+        tails, heads, capacities = (
+            np.concatenate([np.asarray(x, dtype=np.int64) for x in xs])
+            for xs in (tails, heads, capacities)
+        )
+        keep = capacities > 0
+        n = 4 + self.n_resources + self.n_days
+        return scipy.sparse.csr_matrix(
+            (
+                capacities[keep].astype(np.int32),
+                (tails[keep].astype(np.int32), heads[keep].astype(np.int32)),
+            ),
+            shape=(n, n),
+        )
+
+    def max_flow(self):
+        res = scipy.sparse.csgraph.maximum_flow(self.graph(), 2, 3)
+        # `residual` was renamed to `flow` in scipy 1.10
+        flow = res.flow if hasattr(res, "flow") else res.residual
+        return res.flow_value, flow.tocsr()
+
+    def assignment(self):
+        # Boolean mask over the columns or None if there is no feasible
+        # assignment.
+        value, flow = self.max_flow()
+        if value < self.required:
+            return None
+        tails = self.resource_node(self.col_res)
+        heads = self.day_node(self.col_day)
+        return np.asarray(flow[tails, heads]).reshape(-1) > 0
+
+
+def matching(col_res, col_day, capacity, n_days):
+    # Maximum matching between resources and days in which resource r takes
+    # up to capacity[r] of its columns and each day at most one. Boolean mask
+    # over the columns.
+    col_res = np.asarray(col_res, dtype=np.int64)
+    col_day = np.asarray(col_day, dtype=np.int64)
+    n_resources = len(capacity)
+    source, sink = 0, 1
+    tails = np.concatenate(
+        [
+            np.full(n_resources, source),
+            2 + col_res,
+            2 + n_resources + np.arange(n_days),
+        ]
+    )
+    heads = np.concatenate(
+        [
+            2 + np.arange(n_resources),
+            2 + n_resources + col_day,
+            np.full(n_days, sink),
+        ]
+    )
+    capacities = np.concatenate(
+        [
+            np.asarray(capacity, dtype=np.int64),
+            np.ones(len(col_res) + n_days, dtype=np.int64),
+        ]
+    )
+    keep = capacities > 0
+    n = 2 + n_resources + n_days
+    graph = scipy.sparse.csr_matrix(
+        (
+            capacities[keep].astype(np.int32),
+            (tails[keep].astype(np.int32), heads[keep].astype(np.int32)),
+        ),
+        shape=(n, n),
+    )
+    res = scipy.sparse.csgraph.maximum_flow(graph, source, sink)
+    flow = (res.flow if hasattr(res, "flow") else res.residual).tocsr()
+    return np.asarray(flow[2 + col_res, 2 + n_resources + col_day]).reshape(-1) > 0
@@ -1,6 +1,7 @@
 import datetime
 
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext as _
 
@@ -54,6 +55,18 @@ class DateForm(forms.Form):
     date = forms.DateField()
 
 
+class DateRangeForm(forms.Form):
+    start = forms.DateField()
+    end = forms.DateField()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get("start"), cleaned_data.get("end")
+        if start and end and end < start:
+            raise ValidationError(_("The end is before the start"), code="invalid")
+        return cleaned_data
+
+
 class PreferenceForm(forms.Form):
     name = forms.CharField()
     date = forms.DateField()
@@ -67,10 +80,19 @@ class ScheduleCreateForm(forms.Form):
     def clean_end(self):
         start = self.cleaned_data["start"]
         end = self.cleaned_data["end"]
-        if (end - start) > datetime.timedelta(days=365):
+        # Schedules longer than a year are only solved in chunks, with a
+        # horizon
+        if not settings.SOLVER_OPTIONS.get("horizon"):
+            if (end - start) > datetime.timedelta(days=365):
+                raise ValidationError(
+                    _("The date range is limited to one year (365 days)"),
+                    code="invalid",
+                )
+        elif (end - start) > datetime.timedelta(days=settings.SOLVER_MAX_DAYS):
             raise ValidationError(
-                _("The date range is limited to one year (365 days)"),
+                _("The date range is limited to %(days)s days"),
                 code="invalid",
+                params={"days": settings.SOLVER_MAX_DAYS},
             )
         return end
 
@@ -0,0 +1,195 @@
+import time
+
+import numpy as np
+
+
+class LocalSearch:
+    # Greedy construction and local search for schedules too large for the
+    # MILP. The state is a partial assignment which always respects the
+    # preferences, the window and the upper bounds. The search minimizes the
+    # violations: days without an assignment and assignments missing to reach
+    # the lower bounds.
+
+    def __init__(self, col_res, col_day, ordinals, window, lower, upper, seed=0):
+        self.ordinals = np.asarray(ordinals, dtype=np.int64)
+        self.lower = np.asarray(lower, dtype=np.int64)
+        self.upper = np.asarray(upper, dtype=np.int64)
+        n_res, n_days = len(self.lower), len(self.ordinals)
+        col_res = np.asarray(col_res, dtype=np.int64)
+        col_day = np.asarray(col_day, dtype=np.int64)
+
+        self.prefers = np.zeros((n_res, n_days), dtype=bool)
+        self.prefers[col_res, col_day] = True
+        order = np.argsort(col_day, kind="stable")
+        bounds = np.searchsorted(col_day[order], np.arange(n_days + 1))
+        self.by_day = [col_res[order[a:b]] for a, b in zip(bounds, bounds[1:])]
+        self.n_preferred = np.bincount(col_res, minlength=n_res)
+
+        # Assigning day d blocks the days lo[d]:hi[d] for the resource
+        self.lo = np.searchsorted(self.ordinals, self.ordinals - window + 1)
+        self.hi = np.searchsorted(self.ordinals, self.ordinals + window)
+        self.blocked = np.zeros((n_res, n_days), dtype=np.int32)
+        self.owner = np.full(n_days, -1, dtype=np.int64)
+        self.count = np.zeros(n_res, dtype=np.int64)
+        self.rng = np.random.default_rng(seed)
+
+    @property
+    def uncovered(self):
+        return int((self.owner < 0).sum())
+
+    @property
+    def missing(self):
+        return int(np.maximum(self.lower - self.count, 0).sum())
+
+    @property
+    def violations(self):
+        return self.uncovered + self.missing
+
+    def assign(self, r, d):
+        self.owner[d] = r
+        self.count[r] += 1
+        self.blocked[r, self.lo[d] : self.hi[d]] += 1
+
+    def unassign(self, d):
+        r = self.owner[d]
+        self.owner[d] = -1
+        self.count[r] -= 1
+        self.blocked[r, self.lo[d] : self.hi[d]] -= 1
+        return r
+
+    def eligible(self, d, exclude=-1):
+        c = self.by_day[d]
+        keep = (self.blocked[c, d] == 0) & (self.count[c] < self.upper[c])
+        keep &= c != exclude
+        return c[keep]
+
+    def pick(self, candidates):
+        # Resources furthest below their lower bound first, then those with
+        # the fewest preferred days, as the others are easier to place later
+        key = np.lexsort(
+            (
+                self.n_preferred[candidates],
+                self.count[candidates] - self.lower[candidates],
+            )
+        )
+        return candidates[key[0]]
+
+    def greedy(self):
+        # Most constrained days first
+        for d in np.argsort([len(c) for c in self.by_day], kind="stable"):
+            candidates = self.eligible(d)
+            if len(candidates):
+                self.assign(self.pick(candidates), d)
+
+    def relocate(self, d, exclude):
+        # Hand day d over from its owner to another eligible resource
+        r = self.unassign(d)
+        candidates = self.eligible(d, exclude=exclude)
+        if len(candidates):
+            self.assign(self.pick(candidates), d)
+            return True
+        self.assign(r, d)
+        return False
+
+    def swap(self, d, exclude):
+        # Exchange day d of its owner r with a day of another resource r2, if
+        # both prefer and can take the other day
+        r = self.unassign(d)
+        for r2 in self.rng.permutation(self.by_day[d]):
+            if r2 == r or r2 == exclude or self.blocked[r2, d]:
+                continue
+            days = np.flatnonzero((self.owner == r2) & self.prefers[r])
+            for d2 in self.rng.permutation(days):
+                self.unassign(d2)
+                if not self.blocked[r, d2]:
+                    self.assign(r, d2)
+                    if not self.blocked[r2, d]:
+                        self.assign(r2, d)
+                        return True
+                    self.unassign(d2)
+                self.assign(r2, d2)
+        self.assign(r, d)
+        return False
+
+    def cover(self, d):
+        # Assign an uncovered day d, moving or swapping away an assignment of
+        # the chosen resource which blocks it
+        candidates = self.eligible(d)
+        if len(candidates):
+            self.assign(self.pick(candidates), d)
+            return True
+        for r in self.rng.permutation(self.by_day[d]):
+            owned = np.flatnonzero(self.owner == r)
+            conflicts = owned[(owned >= self.lo[d]) & (owned < self.hi[d])]
+            if len(conflicts) > 1:
+                continue
+            if len(conflicts) == 1:
+                moves = conflicts
+            elif self.count[r] >= self.upper[r]:
+                moves = self.rng.permutation(owned)
+            else:
+                continue
+            for d2 in moves:
+                if self.relocate(d2, exclude=r) or self.swap(d2, exclude=-1):
+                    if not self.blocked[r, d] and self.count[r] < self.upper[r]:
+                        self.assign(r, d)
+                        return True
+        return False
+
+    def fill(self, r):
+        # Take over a preferred day of a resource above its lower bound
+        days = np.flatnonzero(self.prefers[r] & (self.blocked[r] == 0))
+        owners = self.owner[days]
+        surplus = (owners >= 0) & (self.count[owners] > self.lower[owners])
+        if surplus.any():
+            d = self.rng.choice(days[surplus])
+            self.unassign(d)
+            self.assign(r, d)
+            return True
+        return False
+
+    def improve(self, deadline):
+        while self.violations and time.perf_counter() < deadline:
+            improved = False
+            for d in self.rng.permutation(np.flatnonzero(self.owner < 0)):
+                improved |= self.cover(d)
+                if time.perf_counter() >= deadline:
+                    return
+            short = np.flatnonzero(self.count < self.lower)
+            for r in self.rng.permutation(short):
+                improved |= self.fill(r)
+            if not improved:
+                self.perturb()
+
+    def perturb(self):
+        # Ruin and recreate: clear the assignments around an uncovered day and
+        # refill them in random order. The result is kept unless it has more
+        # violations, so that the search can move along plateaus.
+        uncovered = np.flatnonzero(self.owner < 0)
+        if len(uncovered):
+            d = self.rng.choice(uncovered)
+        else:
+            d = self.rng.integers(len(self.owner))
+        radius = self.rng.integers(1, 4) * (self.hi[d] - self.lo[d])
+        a, b = max(d - radius, 0), min(d + radius + 1, len(self.owner))
+        before, previous = self.violations, self.owner[a:b].copy()
+        self.clear(a, b)
+        for e in a + self.rng.permutation(b - a):
+            candidates = self.eligible(e)
+            if len(candidates):
+                self.assign(self.rng.choice(candidates), e)
+        if self.violations > before:
+            self.clear(a, b)
+            for e in np.flatnonzero(previous >= 0):
+                self.assign(previous[e], a + e)
+
+    def clear(self, a, b):
+        for d in range(a, b):
+            if self.owner[d] >= 0:
+                self.unassign(d)
+
+    def solve(self, time_limit):
+        deadline = time.perf_counter() + time_limit
+        self.greedy()
+        self.improve(deadline)
+        return self.owner
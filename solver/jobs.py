@@ -0,0 +1,221 @@
+import dataclasses
+import datetime
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from solver.admission import Admission, Busy
+from solver.domain import ScheduleException
+from solver.flight import SingleFlight
+from solver.models import SolveJob
+from solver.repository import ScheduleRepository
+from solver.report import SolveReport
+from solver.sizing import TooLarge, route
+
+logger = logging.getLogger(__name__)
+
+repo = ScheduleRepository()
+
+
+def enqueue(schedule, repair=False):
+    # A queued or running job for the same input is shared instead of
+    # solving the schedule twice
+    expire()
+    key = schedule.key()
+    active = [SolveJob.QUEUED, SolveJob.RUNNING]
+    job = (
+        SolveJob.objects.filter(schedule_id=schedule.id, key=key, status__in=active)
+        .order_by("id")
+        .last()
+    )
+    if job is not None:
+        return job
+    return SolveJob.objects.create(schedule_id=schedule.id, repair=repair, key=key)
+
+
+def lock_directory():
+    return settings.SOLVER_LOCK_DIR or os.path.join(
+        tempfile.gettempdir(), "scheduler-solver"
+    )
+
+
+_admission = None
+
+
+def admission():
+    # The host-wide admission controller, rebuilt when the settings change
+    global _admission
+    config = settings.SOLVER_ADMISSION
+    if _admission is None or _admission.config != config:
+        _admission = Admission(
+            os.path.join(lock_directory(), "admission"),
+            slots=config["slots"] or os.cpu_count(),
+            queue=config["queue"],
+            timeout=config["timeout"],
+        )
+        _admission.config = dict(config)
+    return _admission
+
+
+def solve_cost(options):
+    # Solver slots taken by a solve, portfolio solves run several processes
+    workers = options.get("workers") or 1
+    return settings.SOLVER_ADMISSION["threads"] * workers
+
+
+def route_schedule(schedule, start=None, end=None):
+    # "inline", "background" or "heuristic" by the estimated size of the
+    # model, raises TooLarge for schedules which are not solved at all
+    return route(schedule.estimate_size(start, end), **settings.SOLVER_LIMITS)
+
+
+def solver_options(schedule, route, background=False):
+    # Schedules larger than the inline limit are solved with the heuristic
+    # instead of the MILP within requests, in the background only beyond the
+    # background limit. The flow backend is fast enough at any size.
+    options = dict(settings.SOLVER_OPTIONS)
+    if route == "heuristic" or (route == "background" and not background):
+        if schedule.backend(options.get("backend")) == "milp":
+            options["backend"] = "heuristic"
+    return options
+
+
+def single_flight(schedule_id, timeout=None):
+    # Waiting for another solve of the schedule is bounded like waiting for
+    # a solver slot, unless a `timeout` is given
+    if timeout is None:
+        timeout = settings.SOLVER_ADMISSION["timeout"]
+    return SingleFlight(f"schedule-{schedule_id}", lock_directory(), timeout=timeout)
+
+
+def solve(schedule_id, repair=False, job=None):
+    # Solve a schedule and store its assignments, together with the outcome
+    # of `job` if given. Only one solve per schedule runs at a time on a
+    # host. Requests which waited for a solve of the same input, which
+    # completed while they waited, use its result instead of solving again.
+    with single_flight(schedule_id) as flight:
+        schedule = repo.get(schedule_id)
+        key = schedule.key()
+        if flight.waited and flight.last == key and schedule.is_solved():
+            logger.debug(f"Schedule {schedule_id} was solved concurrently")
+            report = SolveReport(coalesced=True)
+            if job is not None:
+                finish(job, report)
+            return report
+        options = solver_options(
+            schedule, route_schedule(schedule), background=bool(job)
+        )
+        with admission().admit(solve_cost(options)) as wait_time:
+            try:
+                if repair and schedule.has_assignments():
+                    report = schedule.repair_assignments(**options)
+                else:
+                    report = schedule.make_assignments(**options)
+            except ScheduleException as e:
+                save(schedule, job, error=e)
+                raise
+        report.wait_time = wait_time
+        if wait_time:
+            logger.info(f"Solver admission: {admission().metrics()}")
+        save(schedule, job, report)
+        flight.done(key)
+        return report
+
+
+def resolve(schedule_id, start, end):
+    # Solve the days from start to end again, see
+    # Schedule.resolve_assignments. Serialized and admitted like solve, but
+    # never coalesced.
+    with single_flight(schedule_id):
+        schedule = repo.get(schedule_id)
+        options = solver_options(schedule, route_schedule(schedule, start, end))
+        with admission().admit(solve_cost(options)) as wait_time:
+            report = schedule.resolve_assignments(start=start, end=end, **options)
+        report.wait_time = wait_time
+        repo.add(schedule)
+        return report
+
+
+def save(schedule, job=None, report=None, error=None):
+    # The assignments and the outcome of the job are stored together, so a
+    # job is never done without its assignments
+    with transaction.atomic():
+        repo.add(schedule)
+        if job is not None:
+            finish(job, report, error)
+
+
+def finish(job, report=None, error=None):
+    if error is None:
+        job.status = SolveJob.DONE
+        job.report = dataclasses.asdict(report)
+    else:
+        job.status = SolveJob.FAILED
+        job.error = str(error)
+    job.finished = timezone.now()
+    job.save()
+
+
+def expire():
+    # Fail running jobs which outlived SOLVER_JOB_TIMEOUT, their worker most
+    # likely died. A worker which still finishes one overwrites the status.
+    cutoff = timezone.now() - datetime.timedelta(seconds=settings.SOLVER_JOB_TIMEOUT)
+    return SolveJob.objects.filter(status=SolveJob.RUNNING, started__lt=cutoff).update(
+        status=SolveJob.FAILED,
+        finished=timezone.now(),
+        error="The solve job timed out.",
+    )
+
+
+def claim():
+    # Oldest queued job, marked as running. The conditional update makes sure
+    # that only one of several workers gets it.
+    expire()
+    while True:
+        job = SolveJob.objects.filter(status=SolveJob.QUEUED).order_by("id").first()
+        if job is None:
+            return None
+        claimed = SolveJob.objects.filter(id=job.id, status=SolveJob.QUEUED).update(
+            status=SolveJob.RUNNING, started=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run(job):
+    try:
+        solve(job.schedule_id, job.repair, job)
+    except Busy as e:
+        # Back into the queue, the schedule is unchanged
+        logger.info(f"Solve job {job.id} requeued: {e}")
+        job.status = SolveJob.QUEUED
+        job.started = None
+        job.save()
+        return job
+    except (ScheduleException, TooLarge) as e:
+        if job.finished is None:
+            finish(job, error=e)
+    except Exception:
+        # The job must not stay running, the worker goes on with the next one
+        logger.exception(f"Solve job {job.id} for schedule {job.schedule_id}")
+        finish(job, error="The solver failed unexpectedly.")
+    logger.info(f"Solve job {job.id} for schedule {job.schedule_id}: {job.status}")
+    return job
+
+
+def to_json(job):
+    return {
+        "id": job.id,
+        "schedule": job.schedule_id,
+        "status": job.status,
+        "error": job.error,
+        "report": job.report,
+        "created": job.created,
+        "started": job.started,
+        "finished": job.finished,
+    }
@@ -0,0 +1,39 @@
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# On Windows a byte far beyond the content of the file is locked, so that
+# the content can still be read and written by the processes waiting for it
+OFFSET = 2**30
+
+
+def lock(f, blocking=True, poll=0.05):
+    # Exclusive lock on an open file, which is released when the process
+    # dies. Raises BlockingIOError if `blocking` is false and the lock is
+    # held elsewhere.
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        return
+    while True:
+        os.lseek(f.fileno(), OFFSET, os.SEEK_SET)
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            if not blocking:
+                raise BlockingIOError(f"{f.name} is locked") from None
+        time.sleep(poll)
+
+
+def unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        return
+    os.lseek(f.fileno(), OFFSET, os.SEEK_SET)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
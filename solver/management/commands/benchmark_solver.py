@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from solver import benchmark
+
+
+def int_list(value):
+    return [int(x) for x in value.split(",")]
+
+
+def float_list(value):
+    return [float(x) for x in value.split(",")]
+
+
+class Command(BaseCommand):
+    help = "Benchmark get_schedule on synthetic problems"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--participants", type=int_list)
+        parser.add_argument("--days", type=int_list)
+        parser.add_argument("--density", type=float_list)
+        parser.add_argument("--window", type=int_list)
+        parser.add_argument(
+            "--exclude-weekends",
+            choices=["yes", "no", "both"],
+            default="both",
+        )
+        parser.add_argument(
+            "--startup",
+            action="store_true",
+            help="Time the process startup with and without the solver instead",
+        )
+        parser.add_argument("--repeat", type=int, default=1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--time-limit", type=float)
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument("--baseline", help="Compare with this JSON file")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Allowed relative slowdown compared to the baseline",
+        )
+
+    def handle(self, *args, **options):
+        if options["startup"]:
+            for name, record in benchmark.startup(options["repeat"]).items():
+                scipy = "with scipy" if record["scipy"] else "without scipy"
+                self.stdout.write(f"{name:10} {record['time']:.3f}s {scipy}")
+            return
+
+        grid = {
+            key: options[key]
+            for key in ["participants", "days", "density", "window"]
+            if options[key]
+        }
+        grid["exclude_weekends"] = {
+            "yes": [True],
+            "no": [False],
+            "both": [False, True],
+        }[options["exclude_weekends"]]
+
+        results = benchmark.run(
+            grid,
+            repeat=options["repeat"],
+            seed=options["seed"],
+            time_limit=options["time_limit"],
+        )
+
+        for name, record in results["cases"].items():
+            self.stdout.write(
+                f"{name:40} vars={record['variables']:>7} nnz={record['nnz']:>8} "
+                f"build={record['build_time']:.3f}s "
+                f"solve={record['solve_time']:.3f}s "
+                f"peak={record['peak_memory'] / 2**20:.1f}MiB {record['status']}"
+            )
+
+        if options["output"]:
+            benchmark.save(results, options["output"])
+
+        if options["baseline"]:
+            baseline = benchmark.load(options["baseline"])
+            found = benchmark.regressions(baseline, results, options["threshold"])
+            for name, metric, before, after in found:
+                self.stderr.write(f"{name} {metric}: {before:.3f} -> {after:.3f}")
+            if found:
+                raise CommandError(f"{len(found)} performance regressions")
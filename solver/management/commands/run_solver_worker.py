@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from solver import jobs
+from solver.apps import preload
+from solver.models import SolveJob
+
+
+class Command(BaseCommand):
+    help = "Run queued solve jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        preload()
+        while True:
+            job = jobs.claim()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+                continue
+            job = jobs.run(job)
+            self.stdout.write(f"Job {job.id}: {job.status} {job.error}".rstrip())
+            if job.status == SolveJob.QUEUED:
+                # The host is busy, give the running solves time to finish
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+import time
+from contextlib import ExitStack
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from solver import jobs
+from solver.admission import Busy
+from solver.batch import solve_schedule
+from solver.repository import ScheduleRepository
+from solver.sizing import TooLarge
+
+
+def int_list(value):
+    return [int(x) for x in value.split(",")]
+
+
+class Command(BaseCommand):
+    help = "Solve all schedules, or those selected by owner or id"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", help="Only schedules of this username")
+        parser.add_argument("--ids", type=int_list, help="Comma separated ids")
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Schedules loaded and written per transaction",
+        )
+        parser.add_argument("--time-limit", type=float)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Solve without writing the assignments",
+        )
+
+    def handle(self, *args, **options):
+        repo = ScheduleRepository()
+        admission = jobs.admission()
+
+        latencies, failed = [], 0
+        start = time.perf_counter()
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(options["workers"]) as pool:
+            # The next batch is solved while the results of the previous one
+            # are written
+            pending = None
+            batches = repo.id_batches(
+                owner=options["owner"],
+                ids=options["ids"],
+                batch_size=options["batch_size"],
+            )
+            for batch in batches:
+                # Schedules which are being solved elsewhere are skipped, the
+                # others stay locked until their assignments are written
+                flights = ExitStack()
+                locked = {}
+                for schedule_id in batch:
+                    try:
+                        locked[schedule_id] = flights.enter_context(
+                            jobs.single_flight(schedule_id, timeout=0)
+                        )
+                    except Busy:
+                        self.stderr.write(f"Schedule {schedule_id}: skipped, busy")
+                tasks = []
+                for schedule in repo.list_by_ids(list(locked)):
+                    try:
+                        route = jobs.route_schedule(schedule)
+                    except TooLarge as e:
+                        self.stderr.write(f"Schedule {schedule.id}: skipped, {e}")
+                        continue
+                    # Pool workers cannot start a portfolio pool of their own
+                    solver_options = dict(
+                        jobs.solver_options(schedule, route, background=True),
+                        workers=None,
+                    )
+                    if options["time_limit"] is not None:
+                        solver_options["time_limit"] = options["time_limit"]
+                    cost = jobs.solve_cost(solver_options)
+                    tasks.append((schedule, solver_options, admission, cost))
+                submitted = pool.map_async(solve_schedule, tasks)
+                if pending is not None:
+                    failed += self.write(repo, *pending, latencies, options)
+                pending = submitted, locked, flights
+            if pending is not None:
+                failed += self.write(repo, *pending, latencies, options)
+        elapsed = time.perf_counter() - start
+
+        if not latencies:
+            self.stdout.write("No schedules to solve")
+            return
+        p50, p95 = np.percentile(latencies, [50, 95])
+        self.stdout.write(
+            f"Solved {len(latencies) - failed} of {len(latencies)} schedules "
+            f"in {elapsed:.2f}s ({len(latencies) / elapsed:.1f}/s), latency "
+            f"p50={p50:.3f}s p95={p95:.3f}s max={max(latencies):.3f}s"
+            + (" (dry run)" if options["dry_run"] else "")
+        )
+
+    def write(self, repo, submitted, locked, flights, latencies, options):
+        failed = 0
+        with flights:
+            results = submitted.get()
+            with transaction.atomic():
+                for schedule, report, error, latency in results:
+                    latencies.append(latency)
+                    if error is not None:
+                        failed += 1
+                        self.stderr.write(f"Schedule {schedule.id}: {error}")
+                    if not options["dry_run"]:
+                        repo.add(schedule)
+            if not options["dry_run"]:
+                for schedule, report, error, latency in results:
+                    if report is not None:
+                        locked[schedule.id].done(schedule.key())
+        return failed
@@ -0,0 +1,60 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("solver", "0026_schedule_window"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SolveJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("repair", models.BooleanField(default=False)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "queued"),
+                            ("running", "running"),
+                            ("done", "done"),
+                            ("failed", "failed"),
+                        ],
+                        default="queued",
+                        max_length=16,
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("started", models.DateTimeField(null=True)),
+                ("finished", models.DateTimeField(null=True)),
+                ("error", models.TextField(blank=True)),
+                ("report", models.JSONField(null=True)),
+                (
+                    "schedule",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="solver.schedule",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="solvejob",
+            index=models.Index(
+                fields=["status", "id"], name="solver_solv_status_719859_idx"
+            ),
+        ),
+    ]
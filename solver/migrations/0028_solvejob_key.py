@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("solver", "0027_solvejob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="solvejob",
+            name="key",
+            field=models.CharField(blank=True, max_length=80),
+        ),
+    ]
@@ -169,3 +169,30 @@ class AssignedDate(models.Model):
                 name="unique_assigned_date",
             )
         ]
+
+
+class SolveJob(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "queued"),
+        (RUNNING, "running"),
+        (DONE, "done"),
+        (FAILED, "failed"),
+    ]
+
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE)
+    repair = models.BooleanField(default=False)
+    # Hash of the solver input, see domain.Schedule.key
+    key = models.CharField(max_length=80, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+    error = models.TextField(blank=True)
+    report = models.JSONField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "id"])]
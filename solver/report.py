@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class SolveReport:
+    backend: str = None
+    cache_hit: bool = False
+    # Size of the model handed to the solver
+    variables: int = 0
+    constraints: int = 0
+    nnz: int = 0
+    # Variables eliminated by the presolve
+    eliminated: int = 0
+    # Seconds spent building the model, in the feasibility check and presolve,
+    # and in the solver itself
+    build_time: float = 0.0
+    presolve_time: float = 0.0
+    solve_time: float = 0.0
+    # Seconds spent waiting for a free solver slot, see solver.admission
+    wait_time: float = 0.0
+    mip_gap: float = None
+    mip_node_count: int = None
+    status: str = None
+    # Rolling horizon: number of chunks and the largest number of assignments
+    # by which a resource misses its bounds
+    chunks: int = 1
+    tolerance: int = 0
+    # Repair and partial re-solve: number of days which were solved again
+    repaired: int = None
+    # Portfolio: number of worker processes and the configuration which won
+    workers: int = 1
+    config: str = None
+    # Whether a concurrent request for the same input solved the schedule
+    coalesced: bool = False
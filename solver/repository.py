@@ -17,6 +17,23 @@ class ScheduleRepository:
     def list_all(self):
         return [o.to_domain() for o in self._queryset()]
 
+    def list_by_ids(self, pks):
+        return [o.to_domain() for o in self._queryset().filter(pk__in=pks)]
+
+    def id_batches(self, owner=None, ids=None, batch_size=100):
+        # Batches of schedule ids in ascending order, optionally only those of
+        # the owner with that username or among `ids`. Pages by id, so that no
+        # cursor stays open while schedules are written in between.
+        qs = Schedule.objects.order_by("pk").values_list("pk", flat=True)
+        if owner is not None:
+            qs = qs.filter(owner__username=owner)
+        if ids is not None:
+            qs = qs.filter(pk__in=ids)
+        last = 0
+        while batch := list(qs.filter(pk__gt=last)[:batch_size]):
+            yield batch
+            last = batch[-1]
+
     def get(self, pk):
         try:
             logger.debug(f"Get Schedule {pk}")
@@ -0,0 +1,39 @@
+from collections import namedtuple
+
+Size = namedtuple("Size", "variables rows nnz")
+
+
+def estimate_size(days, preferences, window=None):
+    # Upper bounds on the size of the MILP of milp_model, computed from the
+    # number of preferred days without building anything. Every variable is
+    # in the row of its day, the row of its resource and, with a window, in
+    # at most `window` window rows.
+    days = set(days)
+    window = window or 1
+    variables = sum(len(days.intersection(dates)) for dates in preferences.values())
+    per_variable = min(window, len(days)) if window > 1 else 0
+    window_rows = min(variables * per_variable, len(preferences) * len(days))
+    rows = len(days) + len(preferences) + window_rows
+    return Size(variables, rows, variables * (2 + per_variable))
+
+
+class TooLarge(Exception):
+    pass
+
+
+def route(size, inline=None, background=None, heuristic=None):
+    # Where to solve a model of `size`, by its number of nonzeros: "inline"
+    # within the request up to `inline`, "background" in a solve job up to
+    # `background`, and "heuristic" in a solve job with the heuristic backend
+    # up to `heuristic`. Limits which are None are unbounded.
+    for name, limit in [
+        ("inline", inline),
+        ("background", background),
+        ("heuristic", heuristic),
+    ]:
+        if limit is None or size.nnz <= limit:
+            return name
+    raise TooLarge(
+        f"The schedule is too large to solve, its model has up to {size.nnz} "
+        f"nonzeros and the limit is {heuristic}."
+    )
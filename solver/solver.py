@@ -1,75 +1,1064 @@
-import datetime
+import atexit
+import logging
+import multiprocessing
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
 import scipy.optimize
+import scipy.sparse
+
+from solver.cache import schedule_key, solutions
+from solver.explain import explain
+from solver.flow import Network
+from solver.heuristic import LocalSearch
+from solver.report import SolveReport
+
+logger = logging.getLogger(__name__)
+
+
+class NoSolution(Exception):
+    # Raised by backends which gave up without proving infeasibility
+    pass
+
+
+class Infeasible(Exception):
+    def __init__(self, message, days=(), resources=()):
+        super().__init__(message)
+        self.days = list(days)
+        self.resources = list(resources)
+
+    def __reduce__(self):
+        # Keep the days and resources when sent back from a worker process
+        return type(self), (str(self), self.days, self.resources)
+
+
+def get_schedule(
+    days,
+    preferences,
+    window=None,
+    time_limit=None,
+    mip_rel_gap=None,
+    presolve=True,
+    backend=None,
+    horizon=None,
+    overlap=1,
+    workers=None,
+    portfolio=None,
+    cache=True,
+    report=False,
+):
+    # `time_limit` (seconds), `mip_rel_gap` and `presolve` are passed on to
+    # HiGHS. If the time limit is reached, the best solution found so far is
+    # returned. `backend` names one of the registered `backends`, by default
+    # the cheapest applicable one is used, or the heuristic for problems too
+    # large for the exact backends. With `horizon`, schedules longer
+    # than `horizon` weeks are solved in chunks, see solve_rolling. With more
+    # than one of `workers`, a portfolio of configurations of `backend` or of
+    # the `portfolio` backends is run in parallel, see solve_portfolio.
+    # Solutions are cached by their input unless `cache` is False. With
+    # `report`, a SolveReport is returned along with the solution.
+    if horizon is None:
+        overlap = None
+    key = schedule_key(days, preferences, window, horizon=horizon, overlap=overlap)
+    if cache and (solution := solutions.get(key)) is not None:
+        logger.debug(f"Solution cache hit {key}")
+        return (solution, SolveReport(cache_hit=True)) if report else solution
+
+    options = dict(time_limit=time_limit, mip_rel_gap=mip_rel_gap, presolve=presolve)
+    options = {key: val for key, val in options.items() if val is not None}
+
+    solve_report = SolveReport()
+    start = time.perf_counter()
+    problem = make_problem(days, preferences, window)
+    solve_report.build_time += time.perf_counter() - start
+
+    days, resources = problem.days, problem.resources
+    if horizon and days and (days[-1] - days[0]).days >= 7 * horizon:
+        res, day = solve_rolling(
+            problem, horizon, overlap, backend, options, solve_report
+        )
+    else:
+        res, day = solve_problem(
+            problem, backend, options, solve_report, workers, portfolio
+        )
+
+    solution = sorted((days[d], resources[r]) for r, d in zip(res, day))
+    if cache:
+        solutions.set(key, solution)
+    return (solution, solve_report) if report else solution
+
+
+def check_feasible(days, preferences, window=None):
+    # Necessary conditions for a solution which are checked in milliseconds
+    # without the MILP: the maximum flow without the window and the window
+    # limits of solver.explain. Raises Infeasible. Returns whether the check
+    # is exact, which it is if the window never binds.
+    if not days:
+        return True
+    if not preferences:
+        days = sorted(days)
+        raise Infeasible(
+            f"The problem is infeasible. Nobody is available on "
+            f"{describe_days(days)}.",
+            days,
+        )
+    problem = make_problem(days, preferences, window)
+    days, ordinals, resources, col_res, col_day, window, lower, upper = problem
+    solve_flow(col_res, col_day, days, resources, lower, upper)
+    return check_window(problem)
+
+
+def check_window(problem):
+    # The window limits of solver.explain, raises Infeasible if one of them
+    # is violated. Returns whether the window never binds.
+    days, ordinals, resources, col_res, col_day, window, lower, upper = problem
+    if window_is_trivial(col_res, col_day, ordinals, window):
+        return True
+    error = infeasible(
+        col_res, col_day, days, resources, lower, upper, ordinals, window
+    )
+    if error.days or error.resources:
+        raise error
+    return False
+
+
+def repair_schedule(
+    days,
+    preferences,
+    assignments,
+    window=None,
+    time_limit=None,
+    mip_rel_gap=None,
+    presolve=True,
+    backend=None,
+    horizon=None,
+    workers=None,
+    portfolio=None,
+    report=False,
+):
+    # Repair an existing solution after small edits instead of solving from
+    # scratch. Assignments which are no longer valid are dropped, and only the
+    # days around the days left without an assignment are solved again, with
+    # all other assignments pinned. The neighbourhood grows until the repair
+    # succeeds, its last step is a full solve. `assignments` are (date, name)
+    # pairs, the options are those of get_schedule. The neighbourhood is
+    # always solved in one piece, so `horizon` is ignored.
+    options = dict(time_limit=time_limit, mip_rel_gap=mip_rel_gap, presolve=presolve)
+    options = {key: val for key, val in options.items() if val is not None}
+    solve_report = SolveReport()
+    start = time.perf_counter()
+    problem = make_problem(days, preferences, window)
+    days, ordinals, resources, col_res, col_day, window, lower, upper = problem
+    owner = current_owner(problem, preferences, assignments)
+    count = np.bincount(owner[owner >= 0], minlength=len(resources))
+    solve_report.build_time += time.perf_counter() - start
+
+    broken = np.flatnonzero(owner < 0)
+    short = np.flatnonzero(count < lower)
+    if not len(broken) and not len(short):
+        centers = np.zeros(0, dtype=np.int64)
+    elif len(broken):
+        centers = ordinals[broken]
+    else:
+        centers = np.unique(ordinals[col_day[np.isin(col_res, short)]])
+
+    solve_report.repaired = 0
+    solve_report.status = "Nothing to repair"
+    radius = window
+    while len(centers):
+        # Days within `radius` days of a center are solved again
+        right = np.searchsorted(centers, ordinals)
+        distance = np.minimum(
+            np.abs(ordinals - centers[np.maximum(right - 1, 0)]),
+            np.abs(ordinals - centers[np.minimum(right, len(centers) - 1)]),
+        )
+        free = distance <= radius
+        try:
+            owner = solve_pinned(
+                problem, owner, free, solve_report, backend, options, workers, portfolio
+            )
+        except Infeasible:
+            if free.all():
+                raise
+            radius *= 2
+            continue
+        logger.debug(f"Repaired {free.sum()} days")
+        break
+
+    assigned = np.flatnonzero(owner >= 0)
+    solution = sorted((days[d], resources[owner[d]]) for d in assigned)
+    return (solution, solve_report) if report else solution
+
+
+def resolve_range(
+    days,
+    preferences,
+    assignments,
+    start,
+    end,
+    window=None,
+    time_limit=None,
+    mip_rel_gap=None,
+    presolve=True,
+    backend=None,
+    horizon=None,
+    workers=None,
+    portfolio=None,
+    report=False,
+):
+    # Solve the days from `start` to `end` (inclusive) again. The valid
+    # assignments on all other days are kept and count towards the bounds
+    # and the window. `assignments` are (date, name) pairs, the options are
+    # those of get_schedule, the range is solved in one piece.
+    options = dict(time_limit=time_limit, mip_rel_gap=mip_rel_gap, presolve=presolve)
+    options = {key: val for key, val in options.items() if val is not None}
+    solve_report = SolveReport(repaired=0)
+    begin = time.perf_counter()
+    problem = make_problem(days, preferences, window)
+    owner = current_owner(problem, preferences, assignments)
+    solve_report.build_time += time.perf_counter() - begin
+
+    ordinals = problem.ordinals
+    free = (ordinals >= start.toordinal()) & (ordinals <= end.toordinal())
+    if free.any():
+        owner = solve_pinned(
+            problem, owner, free, solve_report, backend, options, workers, portfolio
+        )
+
+    assigned = np.flatnonzero(owner >= 0)
+    solution = sorted((problem.days[d], problem.resources[owner[d]]) for d in assigned)
+    return (solution, solve_report) if report else solution
+
+
+def solve_pinned(
+    problem, owner, free, report, backend, options, workers=None, portfolio=None
+):
+    # Solve the days in the mask `free` again, with the assignments in
+    # `owner` on all other days pinned. Pinned assignments count towards the
+    # bounds of their resource and block its window. Returns the new owner of
+    # each day.
+    days, ordinals, resources, col_res, col_day, window, lower, upper = problem
+    pinned = ~free & (owner >= 0)
+    done = np.bincount(owner[pinned], minlength=len(resources))
+    mask = free[col_day] & ~blocked_by(
+        col_res, ordinals[col_day], owner[pinned], ordinals[pinned], window
+    )
+    positions = np.flatnonzero(free)
+    sub = Problem(
+        [days[d] for d in positions],
+        ordinals[positions],
+        resources,
+        col_res[mask],
+        np.searchsorted(positions, col_day[mask]),
+        window,
+        np.maximum(lower - done, 0),
+        upper - done,
+    )
+    r, d = solve_problem(sub, backend, options, report, workers, portfolio)
+    report.repaired = len(positions)
+    owner = np.where(free, -1, owner)
+    owner[positions[d]] = r
+    return owner
+
+
+def current_owner(problem, preferences, assignments):
+    # Resource position assigned to each day by `assignments`, or -1. Only
+    # assignments which still respect the preferences, the window and the
+    # upper bounds are kept, earlier days first.
+    days, ordinals, resources, _, _, window, _, upper = problem
+    day_position = {d: i for i, d in enumerate(days)}
+    resource_position = {name: i for i, name in enumerate(resources)}
+    owner = np.full(len(days), -1, dtype=np.int64)
+    count = np.zeros(len(resources), dtype=np.int64)
+    last = {}
+    for date, name in sorted(assignments):
+        d, r = day_position.get(date), resource_position.get(name)
+        if d is None or r is None or date not in preferences[name]:
+            continue
+        if owner[d] >= 0 or count[r] >= upper[r]:
+            continue
+        if r in last and ordinals[d] - last[r] < window:
+            continue
+        owner[d] = r
+        count[r] += 1
+        last[r] = ordinals[d]
+    return owner
+
+
+def blocked_by(col_res, col_ordinal, pin_res, pin_ordinal, window):
+    # Whether each column lies within the window of a pinned assignment of
+    # the same resource
+    if window == 1 or not len(pin_res):
+        return np.zeros(len(col_res), dtype=bool)
+    offset = min(col_ordinal.min(initial=0), pin_ordinal.min()) - window
+    stride = max(col_ordinal.max(initial=0), pin_ordinal.max()) - offset + window
+    keys = np.sort(pin_res * stride + pin_ordinal - offset)
+    col_keys = col_res * stride + col_ordinal - offset
+    first = np.searchsorted(keys, col_keys - window + 1)
+    end = np.searchsorted(keys, col_keys + window - 1, side="right")
+    return end > first
+
+
+Problem = namedtuple(
+    "Problem", "days ordinals resources col_res col_day window lower upper"
+)
+
+
+def make_problem(days, preferences, window=None):
+    # Days are encoded as their ordinals once, the model is built on those
+    # and the dates are only looked up again for the solution.
+    days = sorted(days)
+    ordinals = np.array([d.toordinal() for d in days], dtype=np.int64)
+    resources = list(preferences.keys())
+    col_res, col_day = variables(ordinals, preferences, resources)
+
+    # Not more than ceil(days/resources) and not less than
+    # floor(days/resources) assignments per resource
+    x = len(days) // len(resources)
+    lower = np.full(len(resources), x)
+    upper = lower + 1
+
+    return Problem(
+        days, ordinals, resources, col_res, col_day, window or 1, lower, upper
+    )
+
+
+def default_backend(days, preferences, window=None, backend=None):
+    # Name of the backend a solve of the schedule would use
+    if not days or not preferences:
+        return None
+    return select_backend(make_problem(days, preferences, window), backend).name
+
+
+backends = {}
+
+
+def register(cls):
+    backends[cls.name] = cls()
+    return cls
+
+
+def select_backend(problem, name=None):
+    if name is not None:
+        if name not in backends:
+            raise ValueError(f"Unknown solver backend {name}")
+        if not backends[name].applicable(problem):
+            raise ValueError(
+                f"The {name} backend does not support a window of "
+                f"{problem.window} days"
+            )
+        return backends[name]
+    candidates = [b for b in backends.values() if b.applicable(problem)]
+    return min(candidates, key=lambda b: b.cost(problem))
+
+
+class Backend:
+    name = None
+    # Whether the backend enforces a window of more than one day
+    supports_window = True
+    # Whether the backend raises Infeasible for problems without a solution,
+    # instead of NoSolution when it gives up
+    reports_infeasibility = True
+
+    def applicable(self, problem):
+        return self.supports_window or window_is_trivial(
+            problem.col_res, problem.col_day, problem.ordinals, problem.window
+        )
+
+    def cost(self, problem):
+        # Rough estimate of the work, only used to rank the backends
+        raise NotImplementedError
+
+    def solve(self, problem, options, report):
+        # Returns the resource and day positions of the assignments and fills
+        # in the SolveReport
+        raise NotImplementedError
+
+
+@register
+class FlowBackend(Backend):
+    name = "flow"
+    supports_window = False
+
+    def cost(self, problem):
+        nodes = len(problem.days) + len(problem.resources)
+        return len(problem.col_res) * np.sqrt(nodes)
+
+    def solve(self, problem, options, report):
+        start = time.perf_counter()
+        selected = solve_flow(
+            problem.col_res,
+            problem.col_day,
+            problem.days,
+            problem.resources,
+            problem.lower,
+            problem.upper,
+        )
+        report.solve_time += time.perf_counter() - start
+        report.variables = len(problem.col_res)
+        report.constraints = len(problem.days) + len(problem.resources)
+        report.nnz = 2 * len(problem.col_res)
+        report.status = "Optimal"
+        return problem.col_res[selected], problem.col_day[selected]
+
+
+@register
+class MilpBackend(Backend):
+    name = "milp"
+
+    def cost(self, problem):
+        # Branch and bound solves many LPs over the variables and the window
+        # rows, an exponential worst case is not taken into account.
+        nodes = len(problem.days) + len(problem.resources)
+        return 100 * len(problem.col_res) * problem.window * np.sqrt(nodes)
+
+    def solve(self, problem, options, report):
+        days, ordinals, resources, col_res, col_day, window, lower, upper = problem
+        start = time.perf_counter()
+
+        # The maximum flow ignores the window, it is a cheap feasibility check.
+        solve_flow(col_res, col_day, days, resources, lower, upper)
+
+        p = propagate(problem)
+        logger.debug(
+            f"Presolve fixed {len(p.fixed_res)} assignments and eliminated "
+            f"{p.eliminated} of {len(col_res)} variables"
+        )
+        report.eliminated = p.eliminated
+        report.presolve_time += time.perf_counter() - start
+        report.status = "Solved by presolve"
+
+        res, day = p.fixed_res, p.fixed_day
+        if len(p.days):
+            try:
+                r, d = solve_aggregated(
+                    p.col_res,
+                    np.searchsorted(p.days, p.col_day),
+                    ordinals[p.days],
+                    window,
+                    p.lower,
+                    p.upper,
+                    options,
+                    report,
+                )
+            except Infeasible as e:
+                # HiGHS only reports that the model is infeasible
+                raise infeasible(
+                    col_res,
+                    col_day,
+                    days,
+                    resources,
+                    lower,
+                    upper,
+                    ordinals,
+                    window,
+                    message=str(e),
+                ) from None
+            res, day = np.concatenate([res, r]), np.concatenate([day, p.days[d]])
+        return res, day
+
+
+@register
+class HeuristicBackend(Backend):
+    name = "heuristic"
+    # The heuristic may miss solutions of feasible problems
+    reports_infeasibility = False
+    # Cost above which the exact backends are considered too slow
+    limit = 1e9
+    # Seconds for the local search without a time limit in the options
+    time_limit = 10
+
+    def cost(self, problem):
+        return self.limit
+
+    def solve(self, problem, options, report):
+        days, ordinals, resources, col_res, col_day, window, lower, upper = problem
+        start = time.perf_counter()
+        # The maximum flow ignores the window. It is the bound of the LP
+        # relaxation without the window rows, so infeasible problems are
+        # still reported and the gap of the heuristic is measured against
+        # zero violations. Problems which are infeasible because of the
+        # window are mostly caught by check_window, instead of searching
+        # until the time limit.
+        solve_flow(col_res, col_day, days, resources, lower, upper)
+        check_window(problem)
+        report.presolve_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        search = LocalSearch(col_res, col_day, ordinals, window, lower, upper)
+        report.build_time += time.perf_counter() - start
+        report.variables = len(col_res)
+
+        start = time.perf_counter()
+        owner = search.solve(options.get("time_limit", self.time_limit))
+        report.solve_time += time.perf_counter() - start
+        # Violations relative to the number of assignments the bounds require
+        violations = search.violations
+        report.mip_gap = violations / (len(days) + lower.sum())
+        if violations:
+            report.status = "Time limit reached"
+            raise NoSolution(
+                f"No schedule was found in time, {search.uncovered} days are "
+                f"not assigned and {search.missing} assignments are missing."
+            )
+        report.status = "Heuristic solution"
+        assigned = np.flatnonzero(owner >= 0)
+        return owner[assigned], assigned
+
+
+def solve_problem(problem, backend, options, report, workers=None, portfolio=None):
+    if workers and workers > 1:
+        return solve_portfolio(problem, backend, options, report, workers, portfolio)
+    b = select_backend(problem, backend)
+    report.backend = b.name
+    logger.debug(f"Solving with the {b.name} backend")
+    return b.solve(problem, dict(options), report)
 
 
-def get_schedule(days, preferences, window=None):
+def solve_portfolio(problem, backend, options, report, workers, portfolio=None):
+    # Run differently configured solves in `workers` processes and keep the
+    # first result. Every solution is optimal, as all solutions have the same
+    # objective value, so the others are cancelled. Configurations cycle over
+    # the `portfolio` backends, by default the one which would be selected,
+    # and vary the order of the resources, which changes the branching of
+    # HiGHS, and its presolve.
+    names = portfolio or [select_backend(problem, backend).name]
+    configs = []
+    for i in range(workers):
+        name, seed = names[i % len(names)], i // len(names)
+        config = dict(options)
+        if seed % 2:
+            config["presolve"] = not config.get("presolve", True)
+        configs.append((problem, name, seed, config))
+
+    pool = take_pool(workers)
+    cancel = True
+    try:
+        error, rank = None, None
+        for name, result in pool.imap_unordered(portfolio_worker, configs):
+            if isinstance(result, Exception):
+                if error is None or error_rank(name, result) > rank:
+                    error, rank = result, error_rank(name, result)
+                continue
+            res, day, worker_report, config = result
+            break
+        else:
+            cancel = False
+            raise error
+    finally:
+        give_pool(workers, pool, cancel)
+
+    worker_report.build_time += report.build_time
+    worker_report.workers = workers
+    worker_report.config = config
+    report.__dict__.update(worker_report.__dict__)
+    logger.debug(f"Portfolio solved by {config}")
+    return res, day
+
+
+def error_rank(name, error):
+    # Proven infeasibility first, then the errors of backends which report
+    # infeasibility over those of backends which may give up
+    return isinstance(error, Infeasible), backends[name].reports_infeasibility
+
+
+# Spawning a portfolio pool and importing scipy in its workers takes far
+# longer than most solves. Processes which mostly solve, see
+# solver.apps.preload, keep one idle pool per number of workers between
+# solves and replace a cancelled one right away. Other processes start a
+# pool per solve, so that they do not hold idle solver processes.
+keep_pools = False
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def take_pool(workers):
+    with _pools_lock:
+        pool = _pools.pop(workers, None)
+    return pool or start_pool(workers)
+
+
+def give_pool(workers, pool, cancel=False):
+    # The workers of a cancelled solve may still be busy with the configs
+    # which lost, so the pool is not reused
+    if cancel or not keep_pools:
+        pool.terminate()
+        pool = None
+    if not keep_pools:
+        return
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = pool or start_pool(workers)
+            return
+    if pool is not None:
+        pool.terminate()
+
+
+@atexit.register
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.terminate()
+        _pools.clear()
+
+
+def start_pool(workers):
+    # Worker processes are spawned, forking a threaded web server is unsafe
+    context = multiprocessing.get_context("spawn")
+    return context.Pool(workers, initializer=start_worker)
+
+
+def start_worker():
+    # Unpickling this function imports the solver and scipy in a new worker,
+    # before its first config arrives
+    pass
+
+
+def portfolio_worker(args):
+    problem, name, seed, options = args
+    try:
+        shuffled = shuffle_resources(problem, seed)
+        report = SolveReport(backend=name)
+        b = select_backend(shuffled, name)
+        res, day = b.solve(shuffled, options, report)
+    except Exception as e:
+        return name, e
+    # Back to the positions of the resources in the original problem
+    position = {r: i for i, r in enumerate(problem.resources)}
+    res = np.array([position[shuffled.resources[r]] for r in res], dtype=np.int64)
+    config = f"{name} seed={seed} presolve={options.get('presolve', True)}"
+    return name, (res, day, report, config)
+
+
+def shuffle_resources(problem, seed):
+    # The same problem with the resources in random order, seed 0 keeps it
+    if seed == 0:
+        return problem
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(problem.resources))
+    rank = np.argsort(order)
+    col_res = rank[problem.col_res]
+    sort = np.lexsort((problem.col_day, col_res))
+    return problem._replace(
+        resources=[problem.resources[r] for r in order],
+        col_res=col_res[sort],
+        col_day=problem.col_day[sort],
+        lower=problem.lower[order],
+        upper=problem.upper[order],
+    )
+
+
+def solve_rolling(problem, horizon, overlap, backend, options, report):
+    # Solve the schedule in chunks of `horizon` weeks. Each chunk looks ahead
+    # `overlap` weeks, which are solved again as part of the next chunk.
+    # Resources assigned at the end of a chunk are blocked for the remainder of
+    # the window in the next one, and the bounds of each chunk aim at the fair
+    # share of the days up to its end, taking the assignments made so far into
+    # account. The bounds are relaxed step by step if a chunk is infeasible.
+    days, ordinals, resources, col_res, col_day, window, lower, upper = problem
+    done = np.zeros(len(resources), dtype=np.int64)
+    last = np.full(len(resources), ordinals[0] - window, dtype=np.int64)
+    res, day = [], []
+    report.chunks = 0
+
+    start = 0
+    while start < len(days):
+        commit = np.searchsorted(ordinals, ordinals[start] + 7 * horizon)
+        end = np.searchsorted(ordinals, ordinals[start] + 7 * (horizon + overlap))
+        final = end == len(days)
+        if final:
+            commit = end
+
+        mask = (col_day >= start) & (col_day < end)
+        mask &= ordinals[col_day] - last[col_res] >= window
+        fraction = end / len(days)
+        target_lower = np.floor(lower * fraction).astype(np.int64) - done
+        target_upper = np.ceil(upper * fraction).astype(np.int64) - done
+
+        size = end - start
+        steps = [0] if final else []
+        steps += [2**i for i in range(int(np.log2(size)) + 1)] + [size]
+        for tolerance in steps:
+            sub = Problem(
+                days[start:end],
+                ordinals[start:end],
+                resources,
+                col_res[mask],
+                col_day[mask] - start,
+                window,
+                np.maximum(target_lower - tolerance, 0),
+                np.maximum(target_upper + tolerance, 0),
+            )
+            try:
+                b = select_backend(sub, backend)
+                r, d = b.solve(sub, options, report)
+                break
+            except Infeasible:
+                if tolerance == size:
+                    raise
+                logger.debug(f"Relaxing the bounds of chunk {report.chunks}")
+
+        report.backend = b.name
+        report.chunks += 1
+        keep = d < commit - start
+        r, d = r[keep], d[keep] + start
+        np.add.at(done, r, 1)
+        np.maximum.at(last, r, ordinals[d])
+        res.append(r)
+        day.append(d)
+        start = commit
+
+    report.tolerance = int(max(0, (lower - done).max(), (done - upper).max()))
+    return np.concatenate(res), np.concatenate(day)
+
+
+Presolved = namedtuple(
+    "Presolved", "fixed_res fixed_day col_res col_day days lower upper eliminated"
+)
+
+
+def propagate(problem):
+    # Fix assignments which are forced, either because only one resource is
+    # left for a day or because a resource has no more days left than its
+    # lower bound. A fixed assignment removes its day from the problem, rules
+    # the resource out for the neighbouring days within the window and
+    # tightens the bounds of the resource. Repeat until nothing changes.
+    days, ordinals, resources, col_res, col_day, window, lower, upper = problem
+    lower, upper = lower.copy(), upper.copy()
+    by_day = [set() for _ in days]
+    by_res = [set() for _ in resources]
+    for j, (r, d) in enumerate(zip(col_res, col_day)):
+        by_day[d].add(j)
+        by_res[r].add(j)
+    open_days = set(range(len(days)))
+    fixed = []
+    dirty_days, dirty_res = set(open_days), set(range(len(resources)))
+
+    def remove(j):
+        by_day[col_day[j]].discard(j)
+        by_res[col_res[j]].discard(j)
+        dirty_days.add(col_day[j])
+        dirty_res.add(col_res[j])
+
+    def fix(j):
+        r, d = col_res[j], col_day[j]
+        fixed.append(j)
+        open_days.discard(d)
+        for k in list(by_day[d]):
+            remove(k)
+        for k in [
+            k for k in by_res[r] if abs(ordinals[col_day[k]] - ordinals[d]) < window
+        ]:
+            remove(k)
+        lower[r] = max(lower[r] - 1, 0)
+        upper[r] -= 1
+
+    while dirty_days or dirty_res:
+        if dirty_days:
+            d = dirty_days.pop()
+            if d not in open_days:
+                continue
+            if not by_day[d]:
+                raise Infeasible(
+                    "The problem is infeasible. "
+                    f"Nobody can be assigned on {days[d].isoformat()}.",
+                    days=[days[d]],
+                )
+            if len(by_day[d]) == 1:
+                fix(next(iter(by_day[d])))
+        else:
+            r = dirty_res.pop()
+            if upper[r] < 0 or len(by_res[r]) < lower[r]:
+                raise Infeasible(
+                    "The problem is infeasible. "
+                    f"Not enough possible days for {resources[r]}.",
+                    resources=[resources[r]],
+                )
+            if upper[r] == 0:
+                for k in list(by_res[r]):
+                    remove(k)
+            elif by_res[r] and len(by_res[r]) == lower[r]:
+                fix(min(by_res[r]))
+
+    fixed = np.array(sorted(fixed), dtype=np.int64)
+    rest = np.array(sorted(set().union(*by_res)), dtype=np.int64)
+    return Presolved(
+        fixed_res=col_res[fixed],
+        fixed_day=col_day[fixed],
+        col_res=col_res[rest],
+        col_day=col_day[rest],
+        days=np.array(sorted(open_days), dtype=np.int64),
+        lower=lower,
+        upper=upper,
+        eliminated=len(col_res) - len(rest),
+    )
+
+
+def solve_aggregated(
+    col_res, col_day, ordinals, window, lower, upper, options=None, report=None
+):
+    # Resources with identical preferences are interchangeable. The MILP is
+    # solved for classes of such resources, with per-class counts, so that the
+    # solver does not branch on permutations of the class members.
+    members, cls_res, cls_day = symmetry_classes(col_res, col_day, lower, upper)
+    size = np.array([len(m) for m in members], dtype=np.int64)
+    first = np.array([m[0] for m in members], dtype=np.int64)
+    selected = solve_milp(
+        cls_res,
+        cls_day,
+        ordinals,
+        window,
+        size * lower[first],
+        size * upper[first],
+        capacity=size,
+        options=options,
+        report=report,
+    )
+    return spread(members, cls_res[selected], cls_day[selected])
+
+
+def symmetry_classes(col_res, col_day, lower, upper):
+    # Group resources by their set of preferred days and their bounds.
+    # Returns the members of each class and the columns of the class model.
+    available = [[] for _ in range(len(lower))]
+    for r, d in zip(col_res, col_day):
+        available[r].append(d)
+    classes = {}
+    for r, a in enumerate(available):
+        classes.setdefault((tuple(a), lower[r], upper[r]), []).append(r)
+    members = [np.array(m) for m in classes.values()]
+    cls_res = np.array(
+        [c for c, (a, _, _) in enumerate(classes) for _ in a], dtype=np.int64
+    )
+    cls_day = np.array([d for a, _, _ in classes for d in a], dtype=np.int64)
+    return members, cls_res, cls_day
+
+
+def spread(members, cls_res, cls_day):
+    # Hand out the days of each class in turn to its members. Any `window`
+    # consecutive days hold at most as many class days as there are members,
+    # so the turns of a member are never within the same window, and the
+    # counts of the members differ by at most one.
+    res, day = [], []
+    for c, m in enumerate(members):
+        d = np.sort(cls_day[cls_res == c])
+        res.append(m[np.arange(len(d)) % len(m)])
+        day.append(d)
+    return np.concatenate(res), np.concatenate(day)
+
+
+def solve_milp(
+    col_res,
+    col_day,
+    ordinals,
+    window,
+    lower,
+    upper,
+    capacity=None,
+    options=None,
+    report=None,
+):
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.milp.html#scipy.optimize.milp
+    report = report or SolveReport()
+    start = time.perf_counter()
+    c, integrality, constraints = milp_model(
+        col_res, col_day, ordinals, window, lower, upper, capacity
+    )
+    report.build_time += time.perf_counter() - start
+    report.variables = len(c)
+    report.constraints = sum(constraint.A.shape[0] for constraint in constraints)
+    report.nnz = sum(constraint.A.nnz for constraint in constraints)
 
-    window = window or 1
+    # solution
+    start = time.perf_counter()
+    res = scipy.optimize.milp(
+        c,
+        integrality=integrality,
+        bounds=scipy.optimize.Bounds(0, 1),
+        constraints=constraints,
+        options=options,
+    )
+    report.solve_time += time.perf_counter() - start
+    report.status = res.message
+    report.mip_gap = res.get("mip_gap")
+    report.mip_node_count = res.get("mip_node_count")
+
+    if res.status == 2:
+        raise Infeasible(res.message)
 
-    resources = set(preferences.keys())
-    labels = [(d, r) for r in resources for d in days]
+    # Without an optimal solution, e.g. on reaching the time limit, HiGHS
+    # still returns the best feasible solution it has found, if any.
+    if res.x is None:
+        raise Exception(res.message)
 
-    def binary_vector(f):
-        return [1 if f(r, d) else 0 for r in resources for d in days]
+    return np.round(res.x) == 1
 
+
+def milp_model(col_res, col_day, ordinals, window, lower, upper, capacity=None):
     # The coefficients of the linear objective function to be minimized
-    c = binary_vector(lambda r, d: True)
+    c = np.ones(len(col_res))
 
     # The type of integrality constraint on each decision variable.
     integrality = c
 
     # Constraints
     constraints = [
-        one_resource_per_day(binary_vector, days),
-        equal_assignments(binary_vector, resources, days),
-        respect_preferences(binary_vector, preferences),
-        consecutive_assignments(binary_vector, resources, days, window),
+        one_resource_per_day(col_day, len(ordinals)),
+        equal_assignments(col_res, lower, upper),
+        consecutive_assignments(col_res, col_day, ordinals, window, capacity),
     ]
+    return c, integrality, constraints
 
-    # solution
-    res = scipy.optimize.milp(c, integrality=integrality, constraints=constraints)
 
-    if res.x is None:
-        raise Exception(res.message)
+def solve_flow(col_res, col_day, days, resources, lower, upper):
+    # Without a window the model is a bipartite b-matching between resources
+    # and days, which is solved exactly by a maximum flow.
+    network = Network(col_res, col_day, lower, upper, len(days))
+    selected = network.assignment()
 
-    solution = sorted(label for label, x in zip(labels, res.x) if x == 1)
-    return solution
+    if selected is None:
+        raise infeasible(col_res, col_day, days, resources, lower, upper)
 
+    return selected
 
-def one_resource_per_day(f, days):
+
+def infeasible(
+    col_res,
+    col_day,
+    days,
+    resources,
+    lower,
+    upper,
+    ordinals=None,
+    window=1,
+    message="The problem is infeasible.",
+):
+    # Name a small set of days or resources which cannot be solved, see
+    # solver.explain, or only give the message if none is found.
+    if ordinals is None:
+        ordinals = np.array([d.toordinal() for d in days], dtype=np.int64)
+    start = time.perf_counter()
+    certificate = explain(col_res, col_day, ordinals, window, lower, upper)
+    logger.debug(f"Explained infeasibility in {time.perf_counter() - start:.4f}s")
+    if certificate is None:
+        return Infeasible(message)
+    kind, d, r, needed, available = certificate
+    dates = [days[i] for i in d]
+    names = [resources[i] for i in r]
+    if kind == "unavailable":
+        reason = f"Nobody is available on {describe_days(dates)}."
+    elif kind == "short":
+        reason = "Less available days than required assignments for " + ", ".join(
+            str(name) for name in names
+        )
+        if window > 1:
+            reason += f", counting only days at least {window} days apart"
+        reason += "."
+    elif kind == "days":
+        reason = (
+            f"Only {describe_names(names)} can be assigned on "
+            f"{describe_days(dates)} and can take at most {available} of "
+            f"these {needed} days."
+        )
+    elif kind == "resources":
+        reason = (
+            f"{describe_names(names)} need at least {needed} assignments but "
+            f"are only available on {available} days together."
+        )
+    else:
+        reason = (
+            f"With a window of {window} days, each participant can only be "
+            f"assigned once on {describe_days(dates)}, but only "
+            f"{describe_names(names)} can be assigned on these days."
+        )
+    return Infeasible(f"The problem is infeasible. {reason}", dates, names)
+
+
+def describe_days(dates, limit=10):
+    if len(dates) > limit:
+        return (
+            f"{len(dates)} days from {dates[0].isoformat()} to "
+            f"{dates[-1].isoformat()}"
+        )
+    return ", ".join(d.isoformat() for d in dates)
+
+
+def describe_names(names):
+    return ", ".join(str(name) for name in names) or "nobody"
+
+
+def window_is_trivial(col_res, col_day, ordinals, window):
+    # The window constraint can be ignored if no resource prefers two days
+    # which are less than `window` days apart.
+    if window == 1 or len(col_res) < 2:
+        return True
+    same = col_res[1:] == col_res[:-1]
+    return bool(np.all(np.diff(ordinals[col_day])[same] >= window))
+
+
+def variables(ordinals, preferences, resources):
+    # One decision variable per preferred (resource, day) pair. Pairs outside
+    # of the preferences are never assigned, so they are left out of the model
+    # altogether. Returns the resource and day position of each column, sorted
+    # by resource and day.
+    col_res, col_day = [], []
+    for r, resource in enumerate(resources):
+        preferred = np.fromiter(
+            (d.toordinal() for d in preferences[resource]), dtype=np.int64
+        )
+        preferred.sort()
+        position = np.searchsorted(ordinals, preferred)
+        found = position < len(ordinals)
+        found[found] = ordinals[position[found]] == preferred[found]
+        position = position[found]
+        col_res.append(np.full(len(position), r, dtype=np.int64))
+        col_day.append(position)
+    if not col_res:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(col_res), np.concatenate(col_day)
+
+
+def sparse_constraint(rows, cols, shape, lb, ub):
+    data = np.ones(len(rows))
+    A = scipy.sparse.coo_array((data, (rows, cols)), shape=shape).tocsr()
+    return scipy.optimize.LinearConstraint(A, lb, ub)
+
+
+def one_resource_per_day(col_day, n_days):
     # Exactly one resource per day
-    return ([f(lambda r, d: d == day) for day in days], 1, 1)
+    cols = np.arange(len(col_day))
+    return sparse_constraint(col_day, cols, (n_days, len(cols)), 1, 1)
 
 
-def equal_assignments(f, resources, days):
-    # Not more than ceil(days/resources) and not less than
-    # floor(days/resources) assignments per resouce
-    x = len(days) // len(resources)
-    return ([f(lambda r, d: r == resource) for resource in resources], x, x + 1)
-
-
-def respect_preferences(f, preferences):
-    # No assignments if day is not in preferences
-    return (
-        [
-            f(lambda r, d: r == resource and d not in available)
-            for resource, available in preferences.items()
-        ],
-        0,
-        0,
-    )
+def equal_assignments(col_res, lower, upper):
+    # Between lower and upper assignments per resource
+    cols = np.arange(len(col_res))
+    return sparse_constraint(col_res, cols, (len(lower), len(cols)), lower, upper)
 
 
-def consecutive_assignments(f, resources, days, window):
-    # Not more than 1 assigment per resource on n consecutive days
-    delta = datetime.timedelta(days=window)
-    return (
-        [
-            f(lambda r, d: r == resource and day >= d and day - d < delta)
-            for resource in resources
-            for day in days
-        ],
-        0,
-        1,
-    )
+def consecutive_assignments(col_res, col_day, ordinals, window, capacity=None):
+    # Not more than 1 assigment per resource on n consecutive days, or not
+    # more than `capacity` for classes of resources
+    if capacity is None:
+        capacity = np.ones(col_res.max(initial=-1) + 1, dtype=np.int64)
+
+    # Day d belongs to the windows ending on the days from d up to last[d]
+    last = np.searchsorted(ordinals, ordinals + window) - 1
+    length = last[col_day] - col_day + 1
+    cols = np.repeat(np.arange(len(col_day)), length)
+    offsets = np.arange(length.sum()) - np.repeat(np.cumsum(length) - length, length)
+    anchors = np.repeat(col_day, length) + offsets
+
+    # One row per (resource, window). Windows holding no more variables than
+    # the capacity can never be violated and are dropped.
+    keys = np.repeat(col_res, length) * len(ordinals) + anchors
+    windows, rows, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    rows = rows.reshape(-1)
+    ub = capacity[windows // len(ordinals)]
+    binding = counts > ub
+    keep = binding[rows]
+    rows, cols = (np.cumsum(binding) - 1)[rows[keep]], cols[keep]
+    shape = (binding.sum(), len(col_day))
+    return sparse_constraint(rows, cols, shape, 0, ub[binding])
@@ -18,6 +18,37 @@ function API(csrf_token, schedule_url){
         })
     }
     
+    this.checkSchedule = function(operations){
+        return fetch(schedule_url + "/check", {
+            method: "POST",
+            headers: {
+                "X-CSRFToken": csrf_token,
+            },
+            body: JSON.stringify({
+                operations: operations,
+            }),
+        }).then(r => r.json())
+    }
+
+    this.getJob = function(job_url){
+        return fetch(job_url, {
+            method: "GET",
+        }).then(r => r.json())
+    }
+
+    this.resolveAssignments = function(startStr, endStr){
+        return fetch(assignments_url, {
+            method: "PATCH",
+            headers: {
+                "X-CSRFToken": csrf_token,
+            },
+            body: JSON.stringify({
+                start: startStr,
+                end: endStr,
+            }),
+        })
+    }
+
     this.addDay = function(dateStr){
         return fetch(days_url, {
             method: "PATCH",
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+from solver.admission import Admission, Busy
+
+
+def test_admit_within_slots(tmp_path):
+    admission = Admission(tmp_path, slots=2, queue=1, timeout=1)
+    with admission.admit() as wait_a, admission.admit() as wait_b:
+        assert wait_a == wait_b == 0
+        assert admission.metrics()["running"] == 2
+    assert admission.metrics()["running"] == 0
+    assert admission.admitted == 2
+
+
+def test_cost_takes_several_slots(tmp_path):
+    admission = Admission(tmp_path, slots=2, queue=0, timeout=1)
+    with admission.admit(cost=2):
+        with pytest.raises(Busy, match="Too many solves are waiting"):
+            with admission.admit():
+                pass
+    assert admission.rejected == 1
+
+
+def test_wait_for_a_free_slot(tmp_path):
+    admission = Admission(tmp_path, slots=1, queue=1, timeout=5, poll=0.01)
+    entered = threading.Event()
+    depth = []
+
+    def hold():
+        with admission.admit():
+            entered.set()
+            time.sleep(0.2)
+            depth.append(admission.metrics()["queue_depth"])
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    entered.wait()
+    with admission.admit() as wait:
+        assert wait > 0.1
+    thread.join()
+    assert depth == [1]
+    assert admission.metrics()["max_wait_time"] == wait
+
+
+def test_timeout(tmp_path):
+    admission = Admission(tmp_path, slots=1, queue=1, timeout=0.05, poll=0.01)
+    with admission.admit():
+        with pytest.raises(Busy, match="Timed out"):
+            with admission.admit():
+                pass
+    assert admission.timeouts == 1
+    assert admission.metrics()["queue_depth"] == 0
@@ -5,9 +5,16 @@ from unittest.mock import patch
 
 from django.urls import reverse
 
-from solver.models import user_to_domain
+from solver import jobs
+from solver.models import SolveJob, user_to_domain
 from solver.repository import ScheduleRepository
 from solver.domain import Schedule, ScheduleException
+from solver.report import SolveReport
+
+
+@pytest.fixture(autouse=True)
+def solver_lock_dir(settings, tmp_path):
+    settings.SOLVER_LOCK_DIR = tmp_path
 
 
 @pytest.fixture(autouse=True)
@@ -41,6 +48,19 @@ def schedule(repo, owner):
     return s
 
 
+@pytest.fixture
+def large_schedule(schedule, repo, settings):
+    # Larger than the inline limit, and solved by the MILP because of the
+    # window
+    settings.SOLVER_LIMITS = {"inline": 0, "background": None, "heuristic": None}
+    schedule.window = 2
+    for date in [datetime.date(2022, 1, 1), datetime.date(2022, 1, 2)]:
+        schedule.add_day(date)
+        schedule.add_preference("foo", date)
+        schedule.add_preference("bar", date)
+    return repo.add(schedule)
+
+
 def test_day_list(client, repo, owner):
     schedule = Schedule(owner=user_to_domain(owner))
     dates = [datetime.date(2022, 1, d) for d in range(1, 7)]
@@ -161,6 +181,77 @@ def test_assignments_list(repo, schedule, client, owner):
     ]
 
 
+def test_patch_assignments_resolves_range(schedule, client, owner, settings):
+    settings.SOLVER_OPTIONS = {"time_limit": 3}
+    client.force_login(owner)
+    with patch.object(Schedule, "resolve_assignments", return_value=SolveReport()) as f:
+        r = client.patch(
+            reverse("api:schedule_assignments", args=[schedule.id]),
+            json.dumps({"start": "2022-01-01", "end": "2022-01-31"}),
+            content_type="application/json",
+        )
+        assert r.status_code == 204
+        f.assert_called_once_with(
+            start=datetime.date(2022, 1, 1),
+            end=datetime.date(2022, 1, 31),
+            time_limit=3,
+        )
+
+
+def test_patch_assignments_busy(schedule, client, owner, settings):
+    settings.SOLVER_ADMISSION = {"slots": 1, "threads": 1, "queue": 0, "timeout": 5}
+    client.force_login(owner)
+    with jobs.admission().admit():
+        with patch.object(Schedule, "resolve_assignments") as f:
+            r = client.patch(
+                reverse("api:schedule_assignments", args=[schedule.id]),
+                json.dumps({"start": "2022-01-01", "end": "2022-01-31"}),
+                content_type="application/json",
+            )
+            f.assert_not_called()
+    assert r.status_code == 503
+
+
+def test_patch_assignments_too_large(schedule, client, owner, repo, settings):
+    settings.SOLVER_LIMITS = {"inline": 0, "background": 0, "heuristic": 0}
+    schedule.add_day(datetime.date(2022, 1, 3))
+    schedule.add_preference("foo", datetime.date(2022, 1, 3))
+    repo.add(schedule)
+    client.force_login(owner)
+    with patch.object(Schedule, "resolve_assignments") as f:
+        r = client.patch(
+            reverse("api:schedule_assignments", args=[schedule.id]),
+            json.dumps({"start": "2022-01-01", "end": "2022-01-31"}),
+            content_type="application/json",
+        )
+        f.assert_not_called()
+    assert r.status_code == 422
+
+
+def test_patch_assignments_invalid_range(schedule, client, owner):
+    client.force_login(owner)
+    r = client.patch(
+        reverse("api:schedule_assignments", args=[schedule.id]),
+        json.dumps({"start": "2022-01-31", "end": "2022-01-01"}),
+        content_type="application/json",
+    )
+    assert r.status_code == 400
+
+
+def test_patch_assignments_error(schedule, client, owner):
+    client.force_login(owner)
+    with patch.object(
+        Schedule, "resolve_assignments", side_effect=ScheduleException("infeasible")
+    ):
+        r = client.patch(
+            reverse("api:schedule_assignments", args=[schedule.id]),
+            json.dumps({"start": "2022-01-01", "end": "2022-01-31"}),
+            content_type="application/json",
+        )
+    assert r.status_code == 500
+    assert json.loads(r.content) == {"error": "infeasible"}
+
+
 def test_assignments_list_unauthenticated(schedule, client):
     r = client.get(reverse("api:schedule_assignments", args=[schedule.id]))
     assert r.status_code == 403
@@ -213,23 +304,170 @@ def test_get_schedule(client, owner, repo, schedule):
 
 def test_patch_schedule_calls_make_assignments_returns_204(schedule, client, owner):
     client.force_login(owner)
-    with patch.object(Schedule, "make_assignments") as f:
+    with patch.object(Schedule, "make_assignments", return_value=SolveReport()) as f:
         r = client.patch(reverse("api:schedule", args=[schedule.id]))
         assert r.status_code == 204
         f.assert_called_once()
 
 
+def test_patch_schedule_uses_solver_options(schedule, client, owner, settings):
+    settings.SOLVER_OPTIONS = {"time_limit": 3}
+    client.force_login(owner)
+    with patch.object(Schedule, "make_assignments", return_value=SolveReport()) as f:
+        client.patch(reverse("api:schedule", args=[schedule.id]))
+        f.assert_called_once_with(time_limit=3)
+
+
 def test_patch_persists_schedule(schedule, client, owner, repo):
     client.force_login(owner)
     schedule.add_preference("foo", datetime.date(2022, 1, 1))
     repo.add(schedule)
     solution = [(datetime.date(2022, 1, 1), "foo")]
-    with patch("solver.domain.get_schedule", return_value=solution):
+    with patch("solver.domain.get_schedule", return_value=(solution, SolveReport())):
         client.patch(reverse("api:schedule", args=[schedule.id]))
     s = repo.get(schedule.id)
     assert s.assignments == {("foo", datetime.date(2022, 1, 1))}
 
 
+def test_patch_schedule_with_repair_calls_repair_assignments(
+    schedule, client, owner, repo
+):
+    client.force_login(owner)
+    schedule.add_preference("foo", datetime.date(2022, 1, 1))
+    schedule.add_assignment("foo", datetime.date(2022, 1, 1))
+    repo.add(schedule)
+    with patch.object(
+        Schedule, "repair_assignments", return_value=SolveReport()
+    ) as f, patch.object(Schedule, "make_assignments") as g:
+        r = client.patch(
+            reverse("api:schedule", args=[schedule.id]),
+            json.dumps({"repair": True}),
+            content_type="application/json",
+        )
+        assert r.status_code == 204
+        f.assert_called_once()
+        g.assert_not_called()
+
+
+def test_patch_schedule_async_queues_job(large_schedule, client, owner, settings):
+    settings.SOLVER_ASYNC = True
+    client.force_login(owner)
+    with patch.object(Schedule, "make_assignments") as f:
+        r = client.patch(reverse("api:schedule", args=[large_schedule.id]))
+        f.assert_not_called()
+    assert r.status_code == 202
+    data = json.loads(r.content)
+    assert data["status"] == "queued"
+    assert data["schedule"] == large_schedule.id
+    assert r["Location"] == data["url"] == reverse("api:job", args=[data["id"]])
+
+
+def test_patch_small_schedule_async_is_solved_inline(schedule, client, owner, settings):
+    settings.SOLVER_ASYNC = True
+    client.force_login(owner)
+    with patch.object(Schedule, "make_assignments", return_value=SolveReport()) as f:
+        r = client.patch(reverse("api:schedule", args=[schedule.id]))
+        f.assert_called_once()
+    assert r.status_code == 204
+    assert not SolveJob.objects.exists()
+
+
+def test_patch_large_schedule_uses_heuristic(large_schedule, client, owner):
+    client.force_login(owner)
+    with patch.object(Schedule, "make_assignments", return_value=SolveReport()) as f:
+        r = client.patch(reverse("api:schedule", args=[large_schedule.id]))
+        assert f.call_args.kwargs["backend"] == "heuristic"
+    assert r.status_code == 204
+    assert not SolveJob.objects.exists()
+
+
+def test_patch_large_schedule_without_window_uses_flow(
+    schedule, repo, client, owner, settings
+):
+    settings.SOLVER_LIMITS = {"inline": 0, "background": None, "heuristic": None}
+    schedule.add_day(datetime.date(2022, 1, 1))
+    schedule.add_preference("foo", datetime.date(2022, 1, 1))
+    repo.add(schedule)
+    client.force_login(owner)
+    with patch.object(Schedule, "make_assignments", return_value=SolveReport()) as f:
+        r = client.patch(reverse("api:schedule", args=[schedule.id]))
+        assert f.call_args.kwargs["backend"] is None
+    assert r.status_code == 204
+
+
+def test_large_schedule_job_is_solved_exactly(large_schedule):
+    jobs.enqueue(large_schedule)
+    with patch.object(Schedule, "make_assignments", return_value=SolveReport()) as f:
+        jobs.run(jobs.claim())
+        assert f.call_args.kwargs["backend"] is None
+
+
+def test_patch_too_large_schedule(schedule, repo, client, owner, settings):
+    settings.SOLVER_LIMITS = {"inline": 0, "background": 0, "heuristic": 0}
+    schedule.add_day(datetime.date(2022, 1, 1))
+    schedule.add_preference("foo", datetime.date(2022, 1, 1))
+    repo.add(schedule)
+    client.force_login(owner)
+    r = client.patch(reverse("api:schedule", args=[schedule.id]))
+    assert r.status_code == 422
+    assert "too large" in json.loads(r.content)["error"]
+
+
+def test_get_job(large_schedule, client, owner, settings):
+    settings.SOLVER_ASYNC = True
+    client.force_login(owner)
+    r = client.patch(reverse("api:schedule", args=[large_schedule.id]))
+    r = client.get(json.loads(r.content)["url"])
+    assert r.status_code == 200
+    assert json.loads(r.content)["status"] == "queued"
+
+
+def test_get_job_unauthorized(large_schedule, client, owner, other, settings):
+    settings.SOLVER_ASYNC = True
+    client.force_login(owner)
+    r = client.patch(reverse("api:schedule", args=[large_schedule.id]))
+    client.force_login(other)
+    r = client.get(json.loads(r.content)["url"])
+    assert r.status_code == 403
+
+
+def test_get_job_not_found(client, owner):
+    client.force_login(owner)
+    r = client.get(reverse("api:job", args=[99]))
+    assert r.status_code == 404
+
+
+def test_patch_schedule_busy(schedule, client, owner, settings):
+    settings.SOLVER_ADMISSION = {"slots": 1, "threads": 1, "queue": 0, "timeout": 5}
+    client.force_login(owner)
+    with jobs.admission().admit():
+        with patch.object(Schedule, "make_assignments") as f:
+            r = client.patch(reverse("api:schedule", args=[schedule.id]))
+            f.assert_not_called()
+    assert r.status_code == 503
+    assert r["Retry-After"] == "5"
+
+
+def test_patch_schedule_waiting_for_other_solve(schedule, client, owner, settings):
+    settings.SOLVER_ADMISSION = {"slots": 1, "threads": 1, "queue": 0, "timeout": 0}
+    client.force_login(owner)
+    with jobs.single_flight(schedule.id):
+        with patch.object(Schedule, "make_assignments") as f:
+            r = client.patch(reverse("api:schedule", args=[schedule.id]))
+            f.assert_not_called()
+    assert r.status_code == 503
+
+
+def test_patch_schedule_reports_server_timing(schedule, client, owner):
+    client.force_login(owner)
+    report = SolveReport(backend="milp", build_time=0.002, solve_time=0.5)
+    with patch.object(Schedule, "make_assignments", return_value=report):
+        r = client.patch(reverse("api:schedule", args=[schedule.id]))
+    assert r["Server-Timing"] == (
+        'build;dur=2.0, presolve;dur=0.0, solve;dur=500.0;desc="milp"'
+    )
+
+
 @pytest.mark.parametrize("method", ["post", "put", "delete"])
 def test_schedule_method_not_allowed(schedule, client, owner, method):
     client.force_login(owner)
@@ -248,6 +486,115 @@ def test_patch_schedule_specific_exception(schedule, client, owner):
         assert json.loads(r.content) == {"error": "foo"}
 
 
+def test_patch_infeasible_schedule_names_days(schedule, repo, client, owner):
+    for day in [1, 2, 3]:
+        schedule.add_day(datetime.date(2022, 1, day))
+    schedule.add_preference("foo", datetime.date(2022, 1, 1))
+    schedule.add_preference("bar", datetime.date(2022, 1, 2))
+    repo.add(schedule)
+    client.force_login(owner)
+    r = client.patch(reverse("api:schedule", args=[schedule.id]))
+    assert r.status_code == 500
+    data = json.loads(r.content)
+    assert data["error"] == (
+        "The problem is infeasible. Nobody is available on 2022-01-03."
+    )
+    assert data["days"] == ["2022-01-03"]
+    assert "participants" not in data
+
+
+def check(client, schedule, operations):
+    return client.post(
+        reverse("api:schedule_check", args=[schedule.id]),
+        json.dumps({"operations": operations}),
+        content_type="application/json",
+    )
+
+
+@pytest.fixture
+def check_schedule(schedule, repo):
+    for day in [1, 2, 3, 4]:
+        schedule.add_day(datetime.date(2022, 1, day))
+        schedule.add_preference("foo", datetime.date(2022, 1, day))
+    schedule.add_preference("bar", datetime.date(2022, 1, 2))
+    schedule.add_preference("bar", datetime.date(2022, 1, 4))
+    return repo.add(schedule)
+
+
+def test_check_schedule(check_schedule, client, owner):
+    client.force_login(owner)
+    r = check(client, check_schedule, [])
+    assert r.status_code == 200
+    assert json.loads(r.content) == {"feasible": True, "exact": True}
+
+
+def test_check_schedule_operations(check_schedule, client, owner, repo):
+    client.force_login(owner)
+    r = check(
+        client,
+        check_schedule,
+        [
+            {"op": "remove_preference", "name": "foo", "date": "2022-01-03"},
+            {"op": "add_day", "date": "2022-01-05"},
+            {"op": "add_preference", "name": "bar", "date": "2022-01-05"},
+        ],
+    )
+    assert json.loads(r.content) == {
+        "feasible": False,
+        "error": "The problem is infeasible. Nobody is available on 2022-01-03.",
+        "days": ["2022-01-03"],
+    }
+    r = check(client, check_schedule, [{"op": "remove_day", "date": "2022-01-03"}])
+    assert json.loads(r.content)["feasible"]
+    schedule = repo.get(check_schedule.id)
+    assert datetime.date(2022, 1, 3) in schedule.preferences["foo"]
+    assert len(schedule.days) == 4
+
+
+def test_check_schedule_with_window(check_schedule, client, owner, repo):
+    check_schedule.window = 2
+    repo.add(check_schedule)
+    client.force_login(owner)
+    r = check(client, check_schedule, [])
+    assert json.loads(r.content) == {"feasible": True, "exact": False}
+    r = check(
+        client,
+        check_schedule,
+        [{"op": "remove_preference", "name": "bar", "date": "2022-01-04"}],
+    )
+    data = json.loads(r.content)
+    assert not data["feasible"]
+    assert data["participants"] == ["bar"]
+
+
+@pytest.mark.parametrize(
+    "operations",
+    [
+        [{"op": "solve"}],
+        [{"op": "add_day"}],
+        [{"op": "add_preference", "date": "2022-01-03"}],
+        ["add_day"],
+        "add_day",
+    ],
+)
+def test_check_schedule_bad_request(check_schedule, client, owner, operations):
+    client.force_login(owner)
+    r = check(client, check_schedule, operations)
+    assert r.status_code == 400
+
+
+def test_check_schedule_unauthorized(check_schedule, client, other):
+    client.force_login(other)
+    r = check(client, check_schedule, [])
+    assert r.status_code == 403
+
+
+def test_check_schedule_method_not_allowed(check_schedule, client, owner):
+    client.force_login(owner)
+    r = client.get(reverse("api:schedule_check", args=[check_schedule.id]))
+    assert r.status_code == 405
+
+
 def test_patch_schedule_unspecific_exception(schedule, client, owner):
     client.force_login(owner)
     with patch.object(Schedule, "make_assignments", side_effect=Exception):
@@ -0,0 +1,122 @@
+import datetime
+import io
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from solver import jobs
+from solver.admission import Admission
+from solver.batch import solve_schedule
+from solver.domain import Schedule
+from solver.models import user_to_domain
+from solver.repository import ScheduleRepository
+
+
+@pytest.fixture(autouse=True)
+def solver_lock_dir(settings, tmp_path):
+    settings.SOLVER_LOCK_DIR = tmp_path
+
+
+@pytest.fixture
+def admission(tmp_path):
+    return Admission(tmp_path, slots=1, queue=0, timeout=0)
+
+
+@pytest.fixture(autouse=True)
+def fast_password_hashing(settings):
+    settings.PASSWORD_HASHERS = [
+        "django.contrib.auth.hashers.MD5PasswordHasher",
+    ]
+
+
+def make_schedule(owner, names):
+    s = Schedule(
+        owner=owner,
+        start=datetime.date(2022, 1, 1),
+        end=datetime.date(2022, 1, 7),
+    )
+    for name in names:
+        s.add_participant(name, weekdays=range(7))
+    return s
+
+
+def test_solve_schedule(admission):
+    s = make_schedule(None, ["foo", "bar"])
+    args = (s, {"cache": False}, admission, 1)
+    schedule, report, error, latency = solve_schedule(args)
+    assert len(schedule.assignments) == 6
+    assert report.backend == "flow"
+    assert error is None
+    assert latency > 0
+
+
+def test_solve_schedule_error(admission):
+    s = make_schedule(None, [])
+    s.add_preference("foo", datetime.date(2022, 1, 1))
+    _, report, error, _ = solve_schedule((s, {}, admission, 1))
+    assert report is None
+    assert "infeasible" in error
+
+
+def test_solve_schedule_busy(admission):
+    s = make_schedule(None, ["foo", "bar"])
+    with admission.admit():
+        schedule, report, error, _ = solve_schedule((s, {}, admission, 1))
+    assert report is None
+    assert "waiting" in error
+    assert not schedule.has_assignments()
+
+
+@pytest.mark.django_db
+def test_command_solves_schedules():
+    User = get_user_model()
+    owner = user_to_domain(User.objects.create_user("owner", password="123"))
+    other = user_to_domain(User.objects.create_user("other", password="123"))
+    repo = ScheduleRepository()
+    a = repo.add(make_schedule(owner, ["foo", "bar"]))
+    b = repo.add(make_schedule(owner, ["baz"]))
+    c = repo.add(make_schedule(other, ["foo"]))
+    out = io.StringIO()
+    call_command(
+        "solve_schedules",
+        "--owner=owner",
+        "--workers=1",
+        "--batch-size=1",
+        stdout=out,
+    )
+    assert "Solved 2 of 2 schedules" in out.getvalue()
+    assert len(repo.get(a.id).assignments) == 6
+    assert len(repo.get(b.id).assignments) == 6
+    assert not repo.get(c.id).has_assignments()
+
+
+@pytest.mark.django_db
+def test_command_dry_run():
+    User = get_user_model()
+    owner = user_to_domain(User.objects.create_user("owner", password="123"))
+    repo = ScheduleRepository()
+    a = repo.add(make_schedule(owner, ["foo", "bar"]))
+    out = io.StringIO()
+    call_command(
+        "solve_schedules", f"--ids={a.id}", "--workers=1", "--dry-run", stdout=out
+    )
+    assert "Solved 1 of 1 schedules" in out.getvalue()
+    assert "dry run" in out.getvalue()
+    assert not repo.get(a.id).has_assignments()
+
+
+@pytest.mark.django_db
+def test_command_skips_schedules_being_solved():
+    User = get_user_model()
+    owner = user_to_domain(User.objects.create_user("owner", password="123"))
+    repo = ScheduleRepository()
+    a = repo.add(make_schedule(owner, ["foo", "bar"]))
+    b = repo.add(make_schedule(owner, ["foo", "bar"]))
+    out, err = io.StringIO(), io.StringIO()
+    with jobs.single_flight(a.id):
+        call_command("solve_schedules", "--workers=1", stdout=out, stderr=err)
+    assert "Solved 1 of 1 schedules" in out.getvalue()
+    assert f"Schedule {a.id}: skipped" in err.getvalue()
+    assert not repo.get(a.id).has_assignments()
+    assert len(repo.get(b.id).assignments) == 6
@@ -0,0 +1,85 @@
+import io
+import json
+
+from django.core.management import call_command
+
+from solver import benchmark
+
+
+def test_generate():
+    days, preferences, window = benchmark.generate(5, 14, 0.5, window=2)
+    assert len(days) == 14
+    assert len(preferences) == 5
+    assert all(dates <= days for dates in preferences.values())
+    assert window == 2
+
+
+def test_generate_excludes_weekends():
+    days, preferences, _ = benchmark.generate(5, 14, 1.0, exclude_weekends=True)
+    assert len(days) == 10
+    assert all(d.weekday() < 5 for d in days)
+    assert all(dates == days for dates in preferences.values())
+
+
+def test_generate_is_reproducible():
+    assert benchmark.generate(5, 30, 0.3, seed=1) == benchmark.generate(
+        5, 30, 0.3, seed=1
+    )
+
+
+def test_run():
+    grid = dict(
+        participants=[3],
+        days=[14],
+        density=[1.0],
+        exclude_weekends=[False],
+        window=[1, 2],
+    )
+    results = benchmark.run(grid)
+    assert set(results["cases"]) == {
+        "p3-d14-a1.0-weekends-w1",
+        "p3-d14-a1.0-weekends-w2",
+    }
+    record = results["cases"]["p3-d14-a1.0-weekends-w2"]
+    assert record["variables"] == 42
+    assert record["nnz"] > 0
+    assert record["status"] == "solved"
+    assert all(record[key] >= 0 for key in ["build_time", "solve_time", "peak_memory"])
+
+
+def test_regressions():
+    baseline = {"cases": {"a": {"solve_time": 1.0}, "b": {"solve_time": 0.001}}}
+    results = {
+        "cases": {
+            "a": {"solve_time": 1.5},
+            "b": {"solve_time": 0.002},
+            "c": {"solve_time": 9.0},
+        }
+    }
+    assert benchmark.regressions(baseline, results, 0.2, ["solve_time"]) == [
+        ("a", "solve_time", 1.0, 1.5)
+    ]
+    assert benchmark.regressions(baseline, results, 0.6, ["solve_time"]) == []
+
+
+def test_command_writes_json(tmp_path):
+    output = tmp_path / "results.json"
+    call_command(
+        "benchmark_solver",
+        "--participants=3",
+        "--days=14",
+        "--density=1",
+        "--window=1",
+        "--exclude-weekends=no",
+        f"--output={output}",
+        stdout=io.StringIO(),
+    )
+    results = json.loads(output.read_text())
+    assert list(results["cases"]) == ["p3-d14-a1.0-weekends-w1"]
+
+
+def test_startup_only_imports_scipy_in_workers():
+    results = benchmark.startup(repeat=1)
+    assert not results["web"]["scipy"]
+    assert results["worker"]["scipy"]
+    assert results["web"]["time"] > 0
@@ -0,0 +1,70 @@
+import datetime
+
+from solver.cache import SolutionCache, schedule_key
+
+days = {datetime.date(2022, 1, d) for d in range(1, 8)}
+
+
+def test_key_does_not_depend_on_order():
+    a = {"foo": {datetime.date(2022, 1, 1)}, "bar": days}
+    b = {"bar": set(sorted(days, reverse=True)), "foo": {datetime.date(2022, 1, 1)}}
+    assert schedule_key(days, a, 2) == schedule_key(list(days), b, 2)
+
+
+def test_key_ignores_preferences_outside_of_days():
+    a = {"foo": days}
+    b = {"foo": days | {datetime.date(2021, 12, 31)}}
+    assert schedule_key(days, a) == schedule_key(days, b)
+
+
+def test_key_depends_on_window():
+    preferences = {"foo": days}
+    assert schedule_key(days, preferences, None) == schedule_key(days, preferences, 1)
+    assert schedule_key(days, preferences, 1) != schedule_key(days, preferences, 2)
+
+
+def test_key_depends_on_preferences():
+    a = {"foo": days}
+    b = {"foo": days - {datetime.date(2022, 1, 1)}}
+    assert schedule_key(days, a) != schedule_key(days, b)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SolutionCache(maxsize=2)
+    cache.set("a", [1])
+    cache.set("b", [2])
+    cache.get("a")
+    cache.set("c", [3])
+    assert cache.get("b") is None
+    assert cache.get("a") == [1]
+    assert cache.get("c") == [3]
+    assert cache.stats() == {"hits": 3, "misses": 1, "size": 2}
+
+
+class Store(dict):
+    def set(self, key, value):
+        self[key] = value
+
+
+def test_second_tier():
+    cache = SolutionCache(maxsize=1, store=Store())
+    cache.set("a", [1])
+    cache.set("b", [2])
+    assert "a" not in cache._entries
+    assert cache.get("a") == [1]
+    assert cache.hits == 1
+
+
+def test_returned_solutions_are_copies():
+    cache = SolutionCache()
+    cache.set("a", [1])
+    cache.get("a").append(2)
+    assert cache.get("a") == [1]
+
+
+def test_key_depends_on_params():
+    preferences = {"foo": days}
+    assert schedule_key(days, preferences, horizon=None) == schedule_key(
+        days, preferences
+    )
+    assert schedule_key(days, preferences, horizon=4) != schedule_key(days, preferences)
@@ -3,6 +3,7 @@ import datetime
 from unittest.mock import patch
 
 from solver.domain import Schedule, AssignmentError, ScheduleException
+from solver.report import SolveReport
 
 
 def test_init_schedule_with_date_range():
@@ -192,7 +193,9 @@ def test_has_assignments():
 
 def test_call_solver():
     s = Schedule()
-    with patch("solver.domain.get_schedule", autospec=True) as f:
+    with patch(
+        "solver.domain.get_schedule", autospec=True, return_value=([], SolveReport())
+    ) as f:
         s.make_assignments()
         f.assert_called_once()
 
@@ -210,12 +213,26 @@ def test_schedule_solve_calls_solver_with_correct_arguments():
     for name, dates in preferences.items():
         for date in dates:
             s.add_preference(name, date)
-    with patch("solver.domain.get_schedule", autospec=True) as f:
+    with patch(
+        "solver.domain.get_schedule", autospec=True, return_value=([], SolveReport())
+    ) as f:
         s.make_assignments()
         f.assert_called_with(
             {datetime.date(2022, 1, day) for day in range(1, 8)},
             preferences,
             window=3,
+            report=True,
+        )
+
+
+def test_schedule_solve_passes_options_to_solver():
+    s = Schedule()
+    with patch(
+        "solver.domain.get_schedule", autospec=True, return_value=([], SolveReport())
+    ) as f:
+        s.make_assignments(time_limit=10, mip_rel_gap=0.01)
+        f.assert_called_with(
+            set(), {}, window=None, report=True, time_limit=10, mip_rel_gap=0.01
         )
 
 
@@ -230,7 +247,7 @@ def test_schedule_solve_creates_assignments():
     with patch(
         "solver.domain.get_schedule",
         autospec=True,
-        return_value=solution,
+        return_value=(solution, SolveReport()),
     ):
         s.make_assignments()
         assert s.assignments == {
@@ -252,7 +269,7 @@ def test_schedule_solve_deletes_old_assignments():
     with patch(
         "solver.domain.get_schedule",
         autospec=True,
-        return_value=solution,
+        return_value=(solution, SolveReport()),
     ):
         s.make_assignments()
         assert s.assignments == {
@@ -288,3 +305,77 @@ def test_if_solve_fails_old_assignments_are_delted():
         except Exception:
             pass
         assert s.assignments == set()
+
+
+def test_make_assignments_returns_report():
+    s = Schedule()
+    report = SolveReport(backend="flow")
+    with patch("solver.domain.get_schedule", autospec=True, return_value=([], report)):
+        assert s.make_assignments() is report
+
+
+def test_repair_assignments_keeps_valid_assignments():
+    s = Schedule(start=datetime.date(2022, 1, 1), end=datetime.date(2022, 1, 9))
+    for name in ["foo", "bar"]:
+        for date in s.days:
+            s.add_preference(name, date)
+    for date in sorted(s.days):
+        s.add_assignment("foo" if date.day % 2 else "bar", date)
+    s.remove_preference("foo", datetime.date(2022, 1, 1))
+    report = s.repair_assignments()
+    assert report.repaired < len(s.days)
+    assert {d for _, d in s.assignments} == s.days
+    assert ("foo", datetime.date(2022, 1, 7)) in s.assignments
+    assert ("bar", datetime.date(2022, 1, 1)) in s.assignments
+
+
+def test_resolve_assignments_keeps_assignments_outside_of_range():
+    s = Schedule(start=datetime.date(2022, 1, 1), end=datetime.date(2022, 1, 9))
+    for name in ["foo", "bar"]:
+        for date in s.days:
+            s.add_preference(name, date)
+    for date in sorted(s.days):
+        s.add_assignment("foo" if date.day <= 4 else "bar", date)
+    s.resolve_assignments(datetime.date(2022, 1, 5), datetime.date(2022, 1, 8))
+    assert {d for _, d in s.assignments} == s.days
+    assert {("foo", datetime.date(2022, 1, x)) for x in range(1, 5)} <= s.assignments
+    assert len([p for p, _ in s.assignments if p == "foo"]) == 4
+
+
+def test_if_resolve_fails_old_assignments_are_kept():
+    s = Schedule()
+    s.add_preference("foo", datetime.date(2022, 7, 21))
+    s.add_assignment("foo", datetime.date(2022, 7, 21))
+    with patch("solver.domain.resolve_range", autospec=True, side_effect=Exception):
+        with pytest.raises(ScheduleException):
+            s.resolve_assignments(
+                datetime.date(2022, 7, 21), datetime.date(2022, 7, 21)
+            )
+    assert s.assignments == {("foo", datetime.date(2022, 7, 21))}
+
+
+def test_copy_is_independent():
+    date = datetime.date(2022, 1, 1)
+    schedule = Schedule(id=1, start=date, end=datetime.date(2022, 1, 3), window=2)
+    schedule.add_preference("foo", date)
+    schedule.add_assignment("foo", date)
+    other = schedule.copy()
+    other.remove_preference("foo", date)
+    other.remove_day(date)
+    other.add_participant("bar")
+    assert (other.id, other.window) == (1, 2)
+    assert schedule.days == {date, datetime.date(2022, 1, 2)}
+    assert schedule.preferences == {"foo": {date}}
+    assert schedule.assignments == {("foo", date)}
+
+
+def test_check():
+    date = datetime.date(2022, 1, 1)
+    schedule = Schedule(start=date, end=datetime.date(2022, 1, 3))
+    schedule.add_preference("foo", date)
+    schedule.add_preference("bar", date)
+    with pytest.raises(ScheduleException, match="2022-01-02") as e:
+        schedule.check()
+    assert e.value.days == [datetime.date(2022, 1, 2)]
+    schedule.add_preference("bar", datetime.date(2022, 1, 2))
+    assert schedule.check()
@@ -0,0 +1,118 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from solver.explain import explain, window_capacity
+from solver.solver import Infeasible, get_schedule, make_problem
+
+dates = [datetime.date(2022, 1, 3) + datetime.timedelta(days=i) for i in range(9)]
+
+
+def certificate(days, preferences, window=None):
+    problem = make_problem(days, preferences, window)
+    return explain(
+        problem.col_res,
+        problem.col_day,
+        problem.ordinals,
+        problem.window,
+        problem.lower,
+        problem.upper,
+    )
+
+
+def test_window_capacity():
+    problem = make_problem(dates, {"a": set(dates), "b": {dates[0], dates[1]}}, 3)
+    capacity = window_capacity(*problem[3:5], problem.ordinals, 3, 2)
+    assert capacity.tolist() == [3, 1]
+
+
+def test_feasible_problem_has_no_certificate():
+    assert certificate(dates, {name: set(dates) for name in "ab"}, 2) is None
+
+
+def test_unavailable_days():
+    c = certificate(dates, {"a": set(dates[1:]), "b": set(dates[2:])})
+    assert c.kind == "unavailable"
+    assert c.days.tolist() == [0]
+
+
+def test_uncovered_days():
+    # Only c is available on the days 2 to 4 and takes at most two of them
+    preferences = {
+        "a": {dates[i] for i in [0, 1, 5, 6, 7, 8]},
+        "b": {dates[i] for i in [0, 1, 5, 6, 7, 8]},
+        "c": {dates[i] for i in [2, 3, 4]},
+        "d": {dates[i] for i in [0, 1, 5, 6, 7, 8]},
+    }
+    c = certificate(dates, preferences, 2)
+    assert c.kind == "days"
+    assert c.days.tolist() == [2, 3, 4]
+    assert c.resources.tolist() == [2]
+    assert (c.needed, c.available) == (3, 2)
+
+
+def test_short_resources():
+    preferences = {"a": set(dates[:6]), "b": set(dates[:6])}
+    c = certificate(dates[:6], preferences, 3)
+    assert c.kind == "short"
+    assert c.resources.tolist() == [0, 1]
+    assert (c.needed, c.available) == (6, 4)
+
+
+def test_resources_without_enough_days_together():
+    preferences = {
+        "a": set(dates[:3]),
+        "b": set(dates[:3]),
+        "c": set(dates),
+        "d": set(dates[3:]),
+    }
+    c = certificate(dates, preferences)
+    assert c.kind == "resources"
+    assert c.days.tolist() == [0, 1, 2]
+    assert c.resources.tolist() == [0, 1]
+    assert (c.needed, c.available) == (4, 3)
+
+
+def test_window():
+    preferences = {"a": set(dates[:4]), "b": set(dates[:4]), "c": {dates[3]}}
+    c = certificate(dates[:4], preferences, 3)
+    assert c.kind == "window"
+    assert c.days.tolist() == [0, 1, 2]
+    assert c.resources.tolist() == [0, 1]
+
+
+def test_get_schedule_explains_window():
+    preferences = {"a": set(dates[:4]), "b": set(dates[:4]), "c": {dates[3]}}
+    with pytest.raises(Infeasible, match="assigned once on 2022-01-03, 2022-01-04"):
+        get_schedule(dates[:4], preferences, window=3, cache=False)
+
+
+def test_get_schedule_names_resources():
+    preferences = {
+        "a": set(dates[:3]),
+        "b": set(dates[:3]),
+        "c": set(dates),
+        "d": set(dates[3:]),
+    }
+    with pytest.raises(Infeasible, match="a, b need at least 4 assignments") as e:
+        get_schedule(dates, preferences, cache=False)
+    assert e.value.days == dates[:3]
+    assert e.value.resources == ["a", "b"]
+
+
+def test_long_day_lists_are_summarized():
+    days = [dates[0] + datetime.timedelta(days=i) for i in range(20)]
+    preferences = {f"p{i}": {days[0]} for i in range(20)}
+    with pytest.raises(Infeasible, match="19 days from 2022-01-04 to 2022-01-22"):
+        get_schedule(days, preferences, cache=False)
+
+
+def test_large_problem_is_explained_quickly():
+    rng = np.random.default_rng(0)
+    days = [dates[0] + datetime.timedelta(days=i) for i in range(365)]
+    preferences = {f"p{i}": {d for d in days if rng.random() < 0.3} for i in range(200)}
+    preferences["p0"] = set()
+    problem = make_problem(days, preferences, 3)
+    args = (*problem[3:5], problem.ordinals, 3, problem.lower, problem.upper)
+    assert explain(*args).resources.tolist() == [0]
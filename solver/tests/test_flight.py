@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from solver.admission import Busy
+from solver.flight import SingleFlight
+
+
+def test_single_flight_records_last_key(tmp_path):
+    with SingleFlight("a", tmp_path) as flight:
+        assert flight.last is None
+        flight.done("key")
+    with SingleFlight("a", tmp_path) as flight:
+        assert flight.last == "key"
+        assert flight.generation == 1
+        assert not flight.waited
+
+
+def test_single_flight_waited_for_completed_call(tmp_path):
+    with SingleFlight("a", tmp_path) as flight:
+        waiter = SingleFlight("a", tmp_path)
+        thread = threading.Thread(target=waiter.__enter__)
+        thread.start()
+        time.sleep(0.05)
+        flight.done("key")
+    thread.join()
+    assert waiter.waited and waiter.last == "key"
+    waiter.__exit__(None, None, None)
+
+
+def test_single_flight_is_exclusive(tmp_path):
+    events = []
+
+    def run(name):
+        with SingleFlight("a", tmp_path):
+            events.append(("enter", name))
+            time.sleep(0.05)
+            events.append(("exit", name))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for enter, exit in zip(events[::2], events[1::2]):
+        assert enter[0] == "enter" and exit == ("exit", enter[1])
+
+
+def test_single_flight_times_out(tmp_path):
+    with SingleFlight("a", tmp_path):
+        with pytest.raises(Busy):
+            with SingleFlight("a", tmp_path, timeout=0.1):
+                pass
+    with SingleFlight("a", tmp_path, timeout=0.1) as flight:
+        assert not flight.waited
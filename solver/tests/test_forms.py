@@ -9,6 +9,22 @@ def test_schedule_create_form_validates_date_range(end, valid):
     assert form.is_valid() is valid
 
 
+def test_schedule_create_form_allows_long_range_with_horizon(settings):
+    settings.SOLVER_OPTIONS = dict(settings.SOLVER_OPTIONS, horizon=8)
+    form = ScheduleCreateForm({"start": "2022-01-01", "end": "2024-12-31"})
+    assert form.is_valid()
+    form = ScheduleCreateForm({"start": "0001-01-01", "end": "9999-12-31"})
+    assert form.is_valid() is False
+
+
+@pytest.mark.parametrize("end, valid", [("2022-01-11", True), ("2022-01-12", False)])
+def test_schedule_create_form_limits_range_with_horizon(settings, end, valid):
+    settings.SOLVER_OPTIONS = dict(settings.SOLVER_OPTIONS, horizon=8)
+    settings.SOLVER_MAX_DAYS = 10
+    form = ScheduleCreateForm({"start": "2022-01-01", "end": end})
+    assert form.is_valid() is valid
+
+
 def test_participant_form_is_invalid_if_participant_already_exists():
     form = ParticipantForm({"name": "foo"}, participants={"foo", "bar", "baz"})
     assert form.is_valid() is False
@@ -0,0 +1,238 @@
+import datetime
+import io
+
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.utils import timezone
+
+from solver import jobs
+from solver.cache import solutions
+from solver.domain import Schedule, ScheduleException
+from solver.flight import SingleFlight
+from solver.models import SolveJob, user_to_domain
+from solver.repository import ScheduleRepository
+
+
+@pytest.fixture(autouse=True)
+def solver_lock_dir(settings, tmp_path):
+    settings.SOLVER_LOCK_DIR = tmp_path
+
+
+@pytest.fixture(autouse=True)
+def fast_password_hashing(settings):
+    settings.PASSWORD_HASHERS = [
+        "django.contrib.auth.hashers.MD5PasswordHasher",
+    ]
+
+
+@pytest.fixture
+def repo():
+    return ScheduleRepository()
+
+
+@pytest.fixture
+def schedule(repo, django_user_model):
+    owner = django_user_model.objects.create_user(username="owner", password="1234")
+    s = Schedule(
+        owner=user_to_domain(owner),
+        start=datetime.date(2022, 1, 1),
+        end=datetime.date(2022, 1, 7),
+    )
+    for name in ["foo", "bar"]:
+        s.add_participant(name, weekdays=range(7))
+    return repo.add(s)
+
+
+@pytest.mark.django_db
+def test_claim_oldest_queued_job(schedule):
+    first = jobs.enqueue(schedule)
+    schedule.add_preference("baz", datetime.date(2022, 1, 1))
+    second = jobs.enqueue(schedule)
+    job = jobs.claim()
+    assert job.id == first.id
+    assert job.status == SolveJob.RUNNING
+    assert job.started is not None
+    assert jobs.claim().id == second.id
+    assert jobs.claim() is None
+
+
+@pytest.mark.django_db
+def test_run_job(schedule, repo):
+    jobs.enqueue(schedule)
+    job = jobs.run(jobs.claim())
+    assert job.status == SolveJob.DONE
+    assert "solve_time" in job.report
+    assert len(repo.get(schedule.id).assignments) == 6
+    job.refresh_from_db()
+    assert job.finished is not None
+
+
+@pytest.mark.django_db
+def test_assignments_are_not_stored_without_job(schedule, repo):
+    jobs.enqueue(schedule)
+    job = jobs.claim()
+    with patch.object(SolveJob, "save", side_effect=DatabaseError):
+        with pytest.raises(DatabaseError):
+            jobs.solve(schedule.id, job=job)
+    assert not repo.get(schedule.id).has_assignments()
+
+
+@pytest.mark.django_db
+def test_run_failing_job(schedule, repo):
+    schedule.add_preference("baz", datetime.date(2022, 1, 1))
+    repo.add(schedule)
+    jobs.enqueue(schedule)
+    job = jobs.run(jobs.claim())
+    assert job.status == SolveJob.FAILED
+    assert "infeasible" in job.error
+
+
+@pytest.mark.django_db
+def test_run_job_with_unexpected_error(schedule):
+    jobs.enqueue(schedule)
+    with patch.object(Schedule, "make_assignments", side_effect=RuntimeError):
+        job = jobs.run(jobs.claim())
+    assert job.status == SolveJob.FAILED
+    job.refresh_from_db()
+    assert job.status == SolveJob.FAILED
+    assert job.finished is not None
+
+
+@pytest.mark.django_db
+def test_stale_running_job_is_failed(schedule, settings):
+    settings.SOLVER_JOB_TIMEOUT = 60
+    stale = jobs.enqueue(schedule)
+    jobs.claim()
+    SolveJob.objects.filter(id=stale.id).update(
+        started=timezone.now() - datetime.timedelta(seconds=61)
+    )
+    job = jobs.enqueue(schedule)
+    assert job.id != stale.id
+    stale.refresh_from_db()
+    assert stale.status == SolveJob.FAILED
+    assert "timed out" in stale.error
+    assert jobs.claim().id == job.id
+
+
+@pytest.mark.django_db
+def test_large_schedule_uses_heuristic(schedule, repo, settings):
+    settings.SOLVER_LIMITS = {"inline": 0, "background": 0, "heuristic": None}
+    solutions.clear()
+    schedule.window = 2
+    repo.add(schedule)
+    jobs.enqueue(schedule)
+    job = jobs.run(jobs.claim())
+    assert job.status == SolveJob.DONE
+    assert job.report["backend"] == "heuristic"
+
+
+@pytest.mark.django_db
+def test_large_schedule_without_window_uses_flow(schedule, settings):
+    settings.SOLVER_LIMITS = {"inline": 0, "background": 0, "heuristic": None}
+    solutions.clear()
+    jobs.enqueue(schedule)
+    job = jobs.run(jobs.claim())
+    assert job.status == SolveJob.DONE
+    assert job.report["backend"] == "flow"
+
+
+@pytest.mark.django_db
+def test_too_large_schedule_is_rejected(schedule, repo, settings):
+    settings.SOLVER_LIMITS = {"inline": 0, "background": 0, "heuristic": 0}
+    jobs.enqueue(schedule)
+    with patch.object(Schedule, "make_assignments") as f:
+        job = jobs.run(jobs.claim())
+        f.assert_not_called()
+    assert job.status == SolveJob.FAILED
+    assert "too large" in job.error
+
+
+@pytest.mark.django_db
+def test_worker_command_runs_queued_jobs(schedule, repo, monkeypatch):
+    # The worker keeps portfolio pools, which other tests do not expect
+    monkeypatch.setattr("solver.solver.keep_pools", False)
+    jobs.enqueue(schedule)
+    out = io.StringIO()
+    call_command("run_solver_worker", "--once", stdout=out)
+    assert out.getvalue().count("done") == 1
+    assert not SolveJob.objects.exclude(status=SolveJob.DONE).exists()
+    assert len(repo.get(schedule.id).assignments) == 6
+
+
+@pytest.mark.django_db
+def test_enqueue_attaches_to_active_job_for_same_input(schedule):
+    first = jobs.enqueue(schedule)
+    assert jobs.enqueue(schedule).id == first.id
+    schedule.add_preference("baz", datetime.date(2022, 1, 1))
+    assert jobs.enqueue(schedule).id != first.id
+
+
+@pytest.mark.django_db
+def test_finished_job_is_not_shared(schedule):
+    jobs.enqueue(schedule)
+    first = jobs.run(jobs.claim())
+    assert jobs.enqueue(schedule).id != first.id
+
+
+@pytest.mark.django_db
+def test_solve_coalesces_with_completed_solve_of_same_input(schedule, repo):
+    jobs.solve(schedule.id)
+    with patch.object(SingleFlight, "waited", True):
+        with patch.object(Schedule, "make_assignments") as f:
+            report = jobs.solve(schedule.id)
+            f.assert_not_called()
+    assert report.coalesced is True
+
+
+@pytest.mark.django_db
+def test_solve_is_not_coalesced_without_waiting(schedule, repo):
+    jobs.solve(schedule.id)
+    assert jobs.solve(schedule.id).coalesced is False
+
+
+@pytest.mark.django_db
+def test_solve_after_preference_removed_and_added_again(schedule, repo):
+    jobs.solve(schedule.id)
+    schedule = repo.get(schedule.id)
+    name, date = sorted(schedule.assignments)[0]
+    schedule.remove_preference(name, date)
+    repo.add(schedule)
+    schedule.add_preference(name, date)
+    repo.add(schedule)
+    with patch.object(SingleFlight, "waited", True):
+        report = jobs.solve(schedule.id)
+    assert report.coalesced is False
+    assert repo.get(schedule.id).is_solved()
+
+
+@pytest.mark.django_db
+def test_solve_after_input_changed(schedule, repo):
+    jobs.solve(schedule.id)
+    schedule = repo.get(schedule.id)
+    schedule.remove_preference("foo", datetime.date(2022, 1, 1))
+    repo.add(schedule)
+    report = jobs.solve(schedule.id)
+    assert report.coalesced is False
+    assert len(repo.get(schedule.id).assignments) == 6
+
+
+@pytest.mark.django_db
+def test_solve_is_not_coalesced_after_failure(schedule, repo):
+    with patch.object(Schedule, "make_assignments", side_effect=ScheduleException):
+        with pytest.raises(ScheduleException):
+            jobs.solve(schedule.id)
+    assert jobs.solve(schedule.id).coalesced is False
+
+
+@pytest.mark.django_db
+def test_busy_job_is_requeued(schedule, settings):
+    settings.SOLVER_ADMISSION = {"slots": 1, "threads": 1, "queue": 0, "timeout": 5}
+    jobs.enqueue(schedule)
+    with jobs.admission().admit():
+        job = jobs.run(jobs.claim())
+    assert job.status == SolveJob.QUEUED
+    assert job.started is None
+    assert jobs.run(jobs.claim()).status == SolveJob.DONE
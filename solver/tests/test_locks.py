@@ -0,0 +1,25 @@
+import pytest
+
+from solver.locks import lock, unlock
+
+
+def test_lock_is_exclusive(tmp_path):
+    path = tmp_path / "a.lock"
+    with open(path, "a+") as f, open(path, "a+") as g:
+        lock(f)
+        with pytest.raises(BlockingIOError):
+            lock(g, blocking=False)
+        unlock(f)
+        lock(g, blocking=False)
+        unlock(g)
+
+
+def test_locked_file_can_be_written(tmp_path):
+    path = tmp_path / "a.lock"
+    with open(path, "a+") as f, open(path, "a+") as g:
+        lock(f)
+        f.write("1 key")
+        f.flush()
+        g.seek(0)
+        assert g.read() == "1 key"
+        unlock(f)
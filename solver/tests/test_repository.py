@@ -146,3 +146,23 @@ def test_assignment_error_if_preferred_date_is_deleted():
     repo.add(t)
     u = repo.get(1)  # should not raise
     assert u.assignments == set()
+
+
+@pytest.mark.django_db
+def test_id_batches():
+    owner = create_user("owner")
+    other = create_user("other")
+    ids = [create_schedule(owner).id for _ in range(5)]
+    create_schedule(other)
+    repo = ScheduleRepository()
+    batches = list(repo.id_batches(owner="owner", batch_size=2))
+    assert batches == [ids[:2], ids[2:4], ids[4:]]
+    assert list(repo.id_batches(ids=[ids[1], ids[3]])) == [[ids[1], ids[3]]]
+
+
+@pytest.mark.django_db
+def test_list_by_ids():
+    owner = create_user("owner")
+    ids = [create_schedule(owner).id for _ in range(3)]
+    schedules = ScheduleRepository().list_by_ids(ids[:2])
+    assert sorted(s.id for s in schedules) == ids[:2]
@@ -1,13 +1,52 @@
 import pytest
+import numpy as np
+import scipy.optimize
 import datetime
+import random
+import time
 from collections import Counter
 from itertools import groupby
+from unittest.mock import patch
 
-from solver.solver import get_schedule
+from solver import solver
+from solver.cache import solutions
+from solver.heuristic import LocalSearch
+from solver.solver import (
+    check_feasible,
+    get_schedule,
+    repair_schedule,
+    resolve_range,
+    shuffle_resources,
+    consecutive_assignments,
+    variables,
+    solve_flow,
+    solve_milp,
+    Infeasible,
+    symmetry_classes,
+    propagate,
+    select_backend,
+    make_problem,
+    milp_model,
+    backends,
+    take_pool,
+    give_pool,
+    error_rank,
+    NoSolution,
+)
+from solver.sizing import TooLarge, estimate_size, route
 
 days = {datetime.date(2022, 1, d) for d in range(1, 31)}
 
 
+def ordinals(dates):
+    return np.array([d.toordinal() for d in dates])
+
+
+@pytest.fixture(autouse=True)
+def clear_solutions():
+    solutions.clear()
+
+
 def test_problem_can_be_solved_by_an_equal_number_of_assignments():
     preferences = {name: days for name in "abc"}
     assignments = get_schedule(days, preferences)
@@ -40,6 +79,23 @@ def test_infeasible_preferences():
         get_schedule(days, preferences)
 
 
+def test_infeasible_preferences_names_uncovered_days():
+    available = days.copy()
+    missing = available.pop()
+    preferences = {name: available for name in "ab"}
+    with patch("scipy.optimize.milp") as milp:
+        with pytest.raises(Infeasible, match=missing.isoformat()) as e:
+            get_schedule(days, preferences, window=2)
+    milp.assert_not_called()
+    assert e.value.days == [missing]
+
+
+def test_infeasible_preferences_names_resources():
+    preferences = {"a": days, "b": set(sorted(days)[:5])}
+    with pytest.raises(Infeasible, match="required assignments for b"):
+        get_schedule(days, preferences, window=2)
+
+
 def test_solution_contains_consecutive_assignments():
     preferences = {name: days for name in "ab"}
     assignments = get_schedule(days, preferences)
@@ -54,3 +110,473 @@ def test_no_consecutive_assignments():
     assert all(
         len(list(g)) == 1 for k, g in groupby(name for day, name in assignments)
     ), "Found consecutive elements"
+
+
+def test_consecutive_assignments_only_covers_days_in_window():
+    dates = sorted(days)[:5]
+    col_res = np.array([0, 0, 0, 0, 0, 1, 1, 1])
+    col_day = np.array([0, 1, 2, 3, 4, 0, 2, 3])
+    A = consecutive_assignments(col_res, col_day, ordinals(dates), 2).A.toarray()
+    assert A.tolist() == [
+        [1, 1, 0, 0, 0, 0, 0, 0],
+        [0, 1, 1, 0, 0, 0, 0, 0],
+        [0, 0, 1, 1, 0, 0, 0, 0],
+        [0, 0, 0, 1, 1, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 1, 1],
+    ]
+
+
+def test_variables_only_for_preferred_days():
+    dates = sorted(days)
+    preferences = {
+        "a": {dates[0], dates[2], datetime.date(2021, 12, 31)},
+        "b": {dates[1]},
+    }
+    col_res, col_day = variables(ordinals(dates), preferences, ["a", "b"])
+    assert col_res.tolist() == [0, 0, 1]
+    assert col_day.tolist() == [0, 2, 1]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_flow_matches_milp(seed):
+    rng = random.Random(seed)
+    dates = sorted(days)
+    resources = list("abcde")
+    preferences = {r: {d for d in dates if rng.random() < 0.4} for r in resources}
+    col_res, col_day = variables(ordinals(dates), preferences, resources)
+    lower = np.full(len(resources), 6)
+    upper = lower + 1
+    try:
+        expected = solve_milp(col_res, col_day, ordinals(dates), 1, lower, upper)
+    except Exception:
+        with pytest.raises(Exception, match="infeasible"):
+            solve_flow(col_res, col_day, dates, resources, lower, upper)
+    else:
+        selected = solve_flow(col_res, col_day, dates, resources, lower, upper)
+        assert selected.sum() == expected.sum() == len(dates)
+        assert sorted(col_day[selected]) == list(range(len(dates)))
+        counter = Counter(col_res[selected])
+        assert all(6 <= counter[r] <= 7 for r in range(len(resources)))
+
+
+def test_symmetry_classes():
+    col_res = np.array([0, 0, 1, 2, 2, 3])
+    col_day = np.array([0, 1, 1, 0, 1, 1])
+    lower = np.array([1, 1, 1, 1, 0])
+    members, cls_res, cls_day = symmetry_classes(col_res, col_day, lower, lower + 1)
+    assert [m.tolist() for m in members] == [[0, 2], [1, 3], [4]]
+    assert cls_res.tolist() == [0, 0, 1]
+    assert cls_day.tolist() == [0, 1, 1]
+
+
+def test_identical_participants_respect_window_and_bounds():
+    preferences = {name: days for name in "abcdefg"}
+    assignments = get_schedule(days, preferences, window=5)
+    by_name = {
+        name: sorted(day for day, n in assignments if n == name) for name in "abcdefg"
+    }
+    assert sorted(day for day, name in assignments) == sorted(days)
+    assert all(4 <= len(dates) <= 5 for dates in by_name.values())
+    assert all(
+        (b - a).days >= 5
+        for dates in by_name.values()
+        for a, b in zip(dates, dates[1:])
+    )
+
+
+def test_presolve_propagates_forced_assignments():
+    dates = sorted(days)[:6]
+    preferences = {"a": set(dates), "b": set(dates[1:])}
+    problem = make_problem(dates, preferences, 2)
+    p = propagate(problem)
+    assert sorted(zip(p.fixed_day, p.fixed_res)) == [
+        (0, 0),
+        (1, 1),
+        (2, 0),
+        (3, 1),
+        (4, 0),
+        (5, 1),
+    ]
+    assert len(p.col_res) == 0
+    assert len(p.days) == 0
+    assert p.eliminated == len(problem.col_res)
+    assert p.lower.tolist() == [0, 0]
+    assert p.upper.tolist() == [1, 1]
+    assert get_schedule(dates, preferences, window=2) == [
+        (d, "ab"[i % 2]) for i, d in enumerate(dates)
+    ]
+
+
+def test_presolve_detects_conflicting_forced_assignments():
+    dates = sorted(days)[:2]
+    preferences = {"a": set(dates), "b": set()}
+    problem = make_problem(dates, preferences, 2)
+    problem = problem._replace(lower=np.array([0, 0]), upper=np.array([2, 2]))
+    with pytest.raises(Infeasible, match="Nobody can be assigned") as e:
+        propagate(problem)
+    assert len(e.value.days) == 1
+
+
+def test_options_are_passed_to_highs():
+    preferences = {name: days for name in "ab"}
+    with patch("scipy.optimize.milp", wraps=scipy.optimize.milp) as milp:
+        get_schedule(days, preferences, window=2, time_limit=5, mip_rel_gap=0.1)
+    assert milp.call_args.kwargs["options"] == {
+        "time_limit": 5,
+        "mip_rel_gap": 0.1,
+        "presolve": True,
+    }
+
+
+def test_time_limit_returns_best_solution_found():
+    milp = scipy.optimize.milp
+
+    def time_limit_reached(*args, **kwargs):
+        res = milp(*args, **kwargs)
+        res.status = 1
+        res.message = "Time limit reached. (HiGHS Status 13)"
+        return res
+
+    preferences = {name: days for name in "ab"}
+    with patch("scipy.optimize.milp", side_effect=time_limit_reached):
+        assignments = get_schedule(days, preferences, window=2, time_limit=1)
+    assert len(assignments) == len(days)
+
+
+def test_cached_solution_skips_model_construction():
+    preferences = {name: days for name in "ab"}
+    expected = get_schedule(days, preferences, window=2)
+    with patch("solver.solver.variables") as f:
+        assert get_schedule(days, preferences, window=2) == expected
+    f.assert_not_called()
+    assert solutions.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_cache_can_be_bypassed():
+    preferences = {name: days for name in "ab"}
+    get_schedule(days, preferences, window=2, cache=False)
+    assert len(solutions) == 0
+
+
+def test_flow_backend_is_selected_without_window():
+    preferences = {name: days for name in "ab"}
+    assert select_backend(make_problem(days, preferences, 1)).name == "flow"
+    assert select_backend(make_problem(days, preferences, 2)).name == "milp"
+
+
+def test_backend_can_be_forced():
+    preferences = {name: days for name in "ab"}
+    assert select_backend(make_problem(days, preferences, 1), "milp").name == "milp"
+    with pytest.raises(ValueError, match="does not support a window of 2 days"):
+        select_backend(make_problem(days, preferences, 2), "flow")
+    with pytest.raises(ValueError, match="Unknown solver backend"):
+        select_backend(make_problem(days, preferences, 1), "foo")
+
+
+@pytest.mark.parametrize("backend", ["flow", "milp", "heuristic"])
+def test_get_schedule_with_backend(backend):
+    preferences = {name: days for name in "abc"}
+    assignments = get_schedule(days, preferences, backend=backend)
+    counter = Counter(name for day, name in assignments)
+    assert counter == {name: 10 for name in preferences}
+
+
+def test_heuristic_backend_is_selected_for_large_problems():
+    preferences = {name: days for name in "ab"}
+    problem = make_problem(days, preferences, 2)
+    with patch.object(backends["milp"], "cost", return_value=1e12):
+        assert select_backend(problem).name == "heuristic"
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_heuristic_respects_window_and_bounds(seed):
+    rng = random.Random(seed)
+    dates = sorted(days)
+    preferences = {name: {d for d in dates if rng.random() < 0.7} for name in "abcd"}
+    try:
+        get_schedule(days, preferences, window=3, backend="milp")
+    except Infeasible:
+        return
+    assignments, report = get_schedule(
+        days, preferences, window=3, backend="heuristic", cache=False, report=True
+    )
+    assert report.mip_gap == 0
+    assert sorted(day for day, name in assignments) == sorted(days)
+    for name, available in preferences.items():
+        assigned = sorted(day for day, n in assignments if n == name)
+        assert set(assigned) <= available
+        assert all((b - a).days >= 3 for a, b in zip(assigned, assigned[1:]))
+        assert 7 <= len(assigned) <= 8
+
+
+def test_heuristic_reports_missing_assignments():
+    dates = sorted(days)[:4]
+    preferences = {"a": set(dates), "b": set(dates)}
+    with patch.object(LocalSearch, "solve", lambda search, time_limit: search.owner):
+        with pytest.raises(NoSolution, match="4 days are not assigned"):
+            get_schedule(dates, preferences, window=2, backend="heuristic")
+
+
+def test_heuristic_checks_the_window_first():
+    dates = sorted(days)[:7]
+    start = time.perf_counter()
+    with pytest.raises(Infeasible) as e:
+        get_schedule(dates, {"a": set(dates)}, window=2, backend="heuristic")
+    assert time.perf_counter() - start < 1
+    assert e.value.resources == ["a"]
+
+
+@pytest.mark.parametrize("window", [None, 2, 5])
+def test_estimate_size_bounds_the_model(window):
+    rng = random.Random(0)
+    dates = sorted(days)
+    preferences = {name: {d for d in dates if rng.random() < 0.5} for name in "abcd"}
+    preferences["a"].add(datetime.date(2023, 1, 1))
+    problem = make_problem(days, preferences, window)
+    _, _, constraints = milp_model(*problem[3:5], problem.ordinals, *problem[5:])
+    size = estimate_size(days, preferences, window)
+    assert size.variables == len(problem.col_res)
+    assert size.rows >= sum(c.A.shape[0] for c in constraints)
+    assert size.nnz >= sum(c.A.nnz for c in constraints)
+    if window is None:
+        assert size.nnz == sum(c.A.nnz for c in constraints)
+
+
+def test_route():
+    size = estimate_size(days, {name: days for name in "ab"})
+    assert size.nnz == 120
+    assert route(size) == "inline"
+    assert route(size, inline=120) == "inline"
+    assert route(size, inline=100) == "background"
+    assert route(size, inline=10, background=100, heuristic=None) == "heuristic"
+    with pytest.raises(TooLarge, match="up to 120 nonzeros and the limit is 100"):
+        route(size, inline=10, background=10, heuristic=100)
+
+
+def test_check_feasible():
+    preferences = {name: set(days) for name in "ab"}
+    with patch("scipy.optimize.milp") as milp:
+        assert check_feasible(days, preferences)
+        assert not check_feasible(days, preferences, window=2)
+    milp.assert_not_called()
+    assert check_feasible(set(), {})
+
+
+def test_check_feasible_raises_infeasible():
+    dates = sorted(days)
+    with pytest.raises(Infeasible, match="Nobody is available") as e:
+        check_feasible(days, {})
+    assert e.value.days == dates
+    preferences = {"a": set(dates[1:]), "b": set(dates[1:])}
+    with pytest.raises(Infeasible) as e:
+        check_feasible(days, preferences)
+    assert e.value.days == dates[:1]
+    preferences = {name: set(dates) for name in "abc"}
+    with pytest.raises(Infeasible, match="counting only days at least 4 days") as e:
+        check_feasible(days, preferences, window=4)
+
+
+def test_report():
+    preferences = {name: days for name in "ab"}
+    assignments, report = get_schedule(days, preferences, window=2, report=True)
+    assert len(assignments) == len(days)
+    assert report.backend == "milp"
+    assert report.cache_hit is False
+    assert report.variables > 0
+    assert report.constraints > 0
+    assert report.nnz > 0
+    assert report.solve_time > 0
+    assert report.mip_node_count is not None
+    assert "Optimal" in report.status
+    _, report = get_schedule(days, preferences, window=2, report=True)
+    assert report.cache_hit is True
+
+
+def test_report_presolve():
+    dates = sorted(days)[:6]
+    preferences = {"a": set(dates), "b": set(dates[1:])}
+    _, report = get_schedule(dates, preferences, window=2, report=True)
+    assert report.eliminated == 11
+    assert report.variables == 0
+    assert report.status == "Solved by presolve"
+
+
+@pytest.mark.parametrize("window", [1, 3])
+def test_rolling_horizon(window):
+    start = datetime.date(2022, 1, 3)
+    dates = {start + datetime.timedelta(days=i) for i in range(2 * 365)}
+    rng = random.Random(0)
+    preferences = {name: {d for d in dates if rng.random() < 0.7} for name in "abcdef"}
+    assignments, report = get_schedule(
+        dates, preferences, window=window, horizon=8, report=True
+    )
+    assert report.chunks == 13
+    assert sorted(day for day, name in assignments) == sorted(dates)
+    for name, available in preferences.items():
+        assigned = sorted(day for day, n in assignments if n == name)
+        assert set(assigned) <= available
+        assert all((b - a).days >= window for a, b in zip(assigned, assigned[1:]))
+        x = len(dates) // len(preferences)
+        assert x - report.tolerance <= len(assigned) <= x + 1 + report.tolerance
+
+
+def test_rolling_horizon_is_not_used_for_short_schedules():
+    preferences = {name: days for name in "ab"}
+    _, report = get_schedule(days, preferences, window=2, horizon=8, report=True)
+    assert report.chunks == 1
+
+
+@pytest.mark.parametrize("window", [1, 2])
+def test_repair_only_changes_days_near_broken_ones(window):
+    dates = sorted(days)
+    preferences = {name: set(dates) for name in "abc"}
+    assignments = get_schedule(days, preferences, window=window)
+    date, name = assignments[10]
+    preferences[name].discard(date)
+    repaired, report = repair_schedule(
+        days, preferences, assignments, window=window, report=True
+    )
+    assert report.repaired < len(days)
+    assert sorted(day for day, _ in repaired) == dates
+    assert (date, name) not in repaired
+    assert set(assignments[:5]) <= set(repaired)
+    for name, available in preferences.items():
+        assigned = sorted(day for day, n in repaired if n == name)
+        assert set(assigned) <= available
+        assert all((b - a).days >= window for a, b in zip(assigned, assigned[1:]))
+        assert len(assigned) == 10
+
+
+def test_repair_without_changes():
+    preferences = {name: days for name in "ab"}
+    assignments = get_schedule(days, preferences, window=2)
+    repaired, report = repair_schedule(
+        days, preferences, assignments, window=2, report=True
+    )
+    assert repaired == assignments
+    assert report.repaired == 0
+
+
+def test_repair_falls_back_to_a_full_solve():
+    dates = sorted(days)[:4]
+    preferences = {"a": set(dates), "b": {dates[0], dates[3]}}
+    assignments = [(dates[0], "a"), (dates[1], "a"), (dates[3], "b")]
+    repaired, report = repair_schedule(dates, preferences, assignments, report=True)
+    assert report.repaired == 4
+    assert repaired == [
+        (dates[0], "b"),
+        (dates[1], "a"),
+        (dates[2], "a"),
+        (dates[3], "b"),
+    ]
+
+
+def test_repair_reports_infeasible_problems():
+    dates = sorted(days)[:4]
+    preferences = {"a": set(dates), "b": set(dates[:1])}
+    with pytest.raises(Infeasible):
+        repair_schedule(dates, preferences, [(d, "a") for d in dates])
+
+
+def test_resolve_range_keeps_assignments_outside_of_range():
+    dates = sorted(days)
+    preferences = {name: set(dates) for name in "abc"}
+    assignments = get_schedule(days, preferences, window=3)
+    start, end = dates[10], dates[19]
+    resolved, report = resolve_range(
+        days, preferences, assignments, start, end, window=3, report=True
+    )
+    assert report.repaired == 10
+    outside = [(d, n) for d, n in assignments if not start <= d <= end]
+    assert set(outside) <= set(resolved)
+    assert sorted(day for day, _ in resolved) == dates
+    for name in preferences:
+        assigned = sorted(day for day, n in resolved if n == name)
+        assert all((b - a).days >= 3 for a, b in zip(assigned, assigned[1:]))
+        assert len(assigned) == 10
+
+
+def test_resolve_range_respects_pinned_bounds():
+    dates = sorted(days)[:4]
+    preferences = {"a": set(dates), "b": set(dates)}
+    assignments = [(dates[0], "a"), (dates[1], "a")]
+    resolved = resolve_range(dates, preferences, assignments, dates[2], dates[3])
+    assert resolved == assignments + [(dates[2], "b"), (dates[3], "b")]
+
+
+def test_resolve_range_is_infeasible_with_pinned_assignments():
+    dates = sorted(days)[:4]
+    preferences = {"a": set(dates), "b": set(dates[:2])}
+    assignments = [(dates[0], "a"), (dates[1], "a")]
+    with pytest.raises(Infeasible):
+        resolve_range(dates, preferences, assignments, dates[2], dates[3])
+
+
+def test_shuffle_resources_keeps_the_problem():
+    rng = random.Random(0)
+    dates = sorted(days)
+    preferences = {name: {d for d in dates if rng.random() < 0.5} for name in "abcd"}
+    problem = make_problem(days, preferences, 2)
+    shuffled = shuffle_resources(problem, 2)
+    assert shuffled.resources != problem.resources
+
+    def pairs(p):
+        return {(p.resources[r], d) for r, d in zip(p.col_res, p.col_day)}
+
+    assert pairs(shuffled) == pairs(problem)
+    assert np.all(np.diff(shuffled.col_res) >= 0)
+
+
+def test_portfolio():
+    preferences = {name: days for name in "abc"}
+    assignments, report = get_schedule(
+        days,
+        preferences,
+        window=2,
+        workers=2,
+        portfolio=["milp", "heuristic"],
+        report=True,
+    )
+    assert report.workers == 2
+    assert report.backend in ["milp", "heuristic"]
+    assert report.config.startswith(report.backend)
+    counter = Counter(name for day, name in assignments)
+    assert counter == {name: 10 for name in preferences}
+
+
+def test_portfolio_pool_is_reused(monkeypatch):
+    monkeypatch.setattr(solver, "keep_pools", True)
+    pool, other = take_pool(2), take_pool(2)
+    give_pool(2, pool)
+    give_pool(2, other)
+    assert solver._pools[2] is pool
+    assert take_pool(2) is pool
+    give_pool(2, pool, cancel=True)
+    replacement = take_pool(2)
+    assert replacement is not pool
+    give_pool(2, replacement)
+    solver.close_pools()
+
+
+def test_portfolio_pool_is_not_kept_by_default():
+    pool = take_pool(2)
+    give_pool(2, pool)
+    assert 2 not in solver._pools
+    other = take_pool(2)
+    assert other is not pool
+    other.terminate()
+
+
+def test_portfolio_prefers_errors_of_exact_backends():
+    gave_up = error_rank("heuristic", NoSolution())
+    assert error_rank("milp", Infeasible("")) > error_rank("milp", ValueError())
+    assert error_rank("milp", ValueError()) > gave_up
+    assert error_rank("heuristic", Infeasible("")) > gave_up
+
+
+def test_portfolio_reports_infeasibility():
+    dates = sorted(days)[:2]
+    preferences = {"a": set(dates), "b": set()}
+    with pytest.raises(Infeasible) as e:
+        get_schedule(dates, preferences, workers=2)
+    assert e.value.resources == ["b"]
@@ -29,6 +29,16 @@ api_patterns = [
         views.schedule_assignments_api,
         name="schedule_assignments",
     ),
+    path(
+        "schedules/<int:pk>/check",
+        views.schedule_check_api,
+        name="schedule_check",
+    ),
+    path(
+        "jobs/<int:pk>",
+        views.job_api,
+        name="job",
+    ),
 ]
 
 schedule_patterns = [
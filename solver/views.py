@@ -1,5 +1,6 @@
 import json
 
+from django.conf import settings
 from django.http import JsonResponse, HttpResponseNotFound, HttpResponseNotAllowed
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
@@ -7,11 +8,15 @@ from django.contrib.auth.views import LoginView as BaseLoginView
 from django.contrib.auth.views import logout_then_login
 from django.shortcuts import render, reverse, redirect
 
-from solver.models import user_to_domain
+from solver import jobs
+from solver.admission import Busy
+from solver.models import SolveJob, user_to_domain
 from solver.repository import ScheduleRepository
 from solver.domain import Schedule, ScheduleException
+from solver.sizing import TooLarge
 from solver.forms import (
     DateForm,
+    DateRangeForm,
     PreferenceForm,
     ScheduleCreateForm,
     ParticipantForm,
@@ -44,8 +49,41 @@ def api_no_content():
     return JsonResponse({}, status=204)
 
 
+def server_timing(report):
+    # https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Server-Timing
+    queue = [f"queue;dur={report.wait_time * 1000:.1f}"] if report.wait_time else []
+    return ", ".join(
+        queue
+        + [
+            f"build;dur={report.build_time * 1000:.1f}",
+            f"presolve;dur={report.presolve_time * 1000:.1f}",
+            f'solve;dur={report.solve_time * 1000:.1f};desc="{report.backend}"',
+        ]
+    )
+
+
+def api_service_unavailable(error, retry_after):
+    response = JsonResponse({"error": str(error)}, status=503)
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def api_unprocessable(error):
+    return JsonResponse({"error": str(error)}, status=422)
+
+
+def error_json(error):
+    data = {"error": str(error)}
+    # Infeasible schedules name the days and participants which cause it
+    if getattr(error, "days", None):
+        data["days"] = error.days
+    if getattr(error, "participants", None):
+        data["participants"] = error.participants
+    return data
+
+
 def api_server_error(error):
-    return JsonResponse({"error": str(error)}, status=500)
+    return JsonResponse(error_json(error), status=500)
 
 
 def api_bad_request(errors):
@@ -93,13 +131,29 @@ def schedule_api(request, schedule):
         }
         return JsonResponse(data)
     if request.method == "PATCH":
+        # With {"repair": true} the current assignments are repaired instead
+        # of solving the schedule from scratch
+        data = get_json_data(request) if request.body else {}
+        # Schedules too large to solve within the request go to a solve job
+        # if a worker runs them
         try:
-            schedule.make_assignments()
+            route = jobs.route_schedule(schedule)
+        except TooLarge as e:
+            return api_unprocessable(e)
+        if settings.SOLVER_ASYNC and route != "inline":
+            job = jobs.enqueue(schedule, repair=bool(data.get("repair")))
+            response = JsonResponse(job_json(job), status=202)
+            response["Location"] = reverse("api:job", args=[job.id])
+            return response
+        try:
+            report = jobs.solve(schedule.id, repair=bool(data.get("repair")))
+        except Busy as e:
+            return api_service_unavailable(e, settings.SOLVER_ADMISSION["timeout"])
         except ScheduleException as e:
             return api_server_error(e)
-        finally:
-            repo.add(schedule)
-        return api_no_content()
+        response = api_no_content()
+        response["Server-Timing"] = server_timing(report)
+        return response
     return api_method_not_allowed()
 
 
@@ -150,8 +204,79 @@ def schedule_preferences_api(request, schedule):
 @api_login_required
 @api_get_schedule
 def schedule_assignments_api(request, schedule):
-    data = [{"participant": p, "start": d} for p, d in sorted(schedule.assignments)]
-    return JsonResponse(data, safe=False)
+    if request.method == "GET":
+        data = [{"participant": p, "start": d} for p, d in sorted(schedule.assignments)]
+        return JsonResponse(data, safe=False)
+    if request.method == "PATCH":
+        # Solve the days from start to end again, keep all other assignments
+        form = DateRangeForm(get_json_data(request))
+        if not form.is_valid():
+            return api_bad_request(form.errors)
+        try:
+            report = jobs.resolve(schedule.id, **form.cleaned_data)
+        except TooLarge as e:
+            return api_unprocessable(e)
+        except Busy as e:
+            return api_service_unavailable(e, settings.SOLVER_ADMISSION["timeout"])
+        except ScheduleException as e:
+            return api_server_error(e)
+        response = api_no_content()
+        response["Server-Timing"] = server_timing(report)
+        return response
+    return api_method_not_allowed()
+
+
+# Operations of a feasibility check, by the Schedule method which applies them
+CHECK_OPERATIONS = {
+    "add_day": DateForm,
+    "remove_day": DateForm,
+    "add_preference": PreferenceForm,
+    "remove_preference": PreferenceForm,
+}
+
+
+@api_login_required
+@api_get_schedule
+def schedule_check_api(request, schedule):
+    # Whether the schedule can still be solved after a list of operations,
+    # e.g. {"op": "remove_preference", "name": "foo", "date": "2022-01-03"}.
+    # The operations are applied to a copy which is not saved.
+    if request.method != "POST":
+        return api_method_not_allowed()
+    data = get_json_data(request)
+    operations = data.get("operations") if isinstance(data, dict) else None
+    if not isinstance(operations, list):
+        return api_bad_request({"operations": ["A list of operations is required."]})
+    schedule = schedule.copy()
+    for i, operation in enumerate(operations):
+        op = operation.get("op") if isinstance(operation, dict) else None
+        if op not in CHECK_OPERATIONS:
+            return api_bad_request({"operations": {i: {"op": ["Unknown operation."]}}})
+        form = CHECK_OPERATIONS[op](operation)
+        if not form.is_valid():
+            return api_bad_request({"operations": {i: form.errors}})
+        getattr(schedule, op)(**form.cleaned_data)
+    try:
+        exact = schedule.check()
+    except ScheduleException as e:
+        return JsonResponse(dict(error_json(e), feasible=False))
+    return JsonResponse({"feasible": True, "exact": exact})
+
+
+def job_json(job):
+    return dict(jobs.to_json(job), url=reverse("api:job", args=[job.id]))
+
+
+@api_login_required
+def job_api(request, pk):
+    job = SolveJob.objects.select_related("schedule__owner").filter(pk=pk).first()
+    if job is None:
+        return api_not_found()
+    if not has_access_to_schedule(request.user, job.schedule):
+        return api_not_authorized()
+    if request.method == "GET":
+        return JsonResponse(job_json(job))
+    return api_method_not_allowed()
 
 
 # Schedule views